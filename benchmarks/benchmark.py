@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+#************************************************************************************
+# Script: benchmarks/benchmark.py
+# Description: Offline benchmark suite for the vpc-inside collectors.
+# Python Version: 3.8.x
+#
+# Runs every collector, the ENI discovery and the full scan_region() pipeline (for
+# every VPC and for one VPC of many)
+# against synthetic accounts (see benchmarks\synthetic.py) of a few sizes, with
+# injected per-call latency and throttling, and records for each:
+#   - wall time
+#   - API calls (and attempts, throttles) and API calls per resource
+#   - peak memory (tracemalloc)
+#
+# The results are compared with a baseline file: more API calls than the
+# baseline, or a wall time / peak memory over it by more than the tolerance,
+# is a regression (wall time also has to grow by more than WALL_TIME_SLACK,
+# so the sub-100ms benchmarks do not flap). Wall time and memory are only
+# compared when the baseline was recorded with the same settings.
+#
+# Every benchmark gets its own account, with throttles drawn from a seed of
+# its own (see new_account()), and with --throttle-rate a profile where no
+# attempt was throttled fails the run: its retry path was never exercised.
+#
+# Clients are created before each benchmark starts, so the one-off cost of
+# loading the botocore service models is not part of the measurements.
+#
+# Note: Run from the project root, no AWS credentials or network are used.
+#
+# EXIT STATUS:
+#     Exit codes:
+#     0 = Success
+#     1 = Regression against the baseline (or --throttle-rate injected no throttle)
+#
+# Usage: python -m benchmarks.benchmark [-h] [--profiles small,medium,large] [--latency SECONDS]
+#                                       [--throttle-rate RATE] [-w WORKERS] [--no-memory]
+#                                       [--baseline FILE] [--update-baseline] [--tolerance RATE]
+#
+# Example:
+# python -m benchmarks.benchmark --profiles small,medium
+# python -m benchmarks.benchmark --profiles large --latency 0.05 --throttle-rate 0.05
+#
+#************************************************************************************
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+from argparse import ArgumentParser
+from collections import namedtuple
+
+# Custom Modules:
+from benchmarks import synthetic
+from modules import clientconfig
+from modules import clients
+from modules import collectors
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+logger = logging.getLogger()
+
+# Profile name -> size (ENIs, instances, Lambdas and ASGs) of the synthetic account
+PROFILES = {"small": 10, "medium": 1000, "large": 50000}
+
+# Services called by the collectors, their clients are created before measuring
+SERVICES = ["ec2", "autoscaling", "lambda", "rds", "elb", "elbv2", "eks"]
+
+# Wall time growth under this many seconds is scheduler noise, never a regression
+WALL_TIME_SLACK = 0.05
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BenchmarkResult = namedtuple("BenchmarkResult", ["name", "wall_time", "api_calls", "attempts", "throttles",
+                                                 "peak_memory", "calls_per_resource"])
+
+# Set by main()
+args = None
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+def build_parser():
+  """
+  Returns the argument parser for the command line.
+  """
+
+  parser = ArgumentParser(description="Offline benchmark suite for the vpc-inside collectors")
+  parser.add_argument('--profiles', default="small,medium", help=f"Comma separated account sizes to run: {', '.join(PROFILES)}")
+  parser.add_argument('--latency', type=float, default=0.01, help="Injected latency per API call attempt, in seconds")
+  parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of API call attempts that are throttled")
+  parser.add_argument("-w", '--workers', type=int, default=16, help="Number of collectors to run concurrently")
+  parser.add_argument('--no-memory', action='store_true', help="Do not trace memory (faster, peak memory is reported as 0)")
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline file to compare with")
+  parser.add_argument('--update-baseline', action='store_true', help="Write the results to the baseline file instead of comparing")
+  parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed wall time / peak memory growth over the baseline")
+  return parser
+
+
+def settings():
+  """
+  Returns the settings that wall time and peak memory depend on.
+  """
+
+  return {"latency": args.latency, "throttle_rate": args.throttle_rate, "workers": args.workers,
+          "memory": not args.no_memory}
+
+
+def new_account(size, name):
+  """
+  Returns a fresh synthetic account for one benchmark. The throttles are seeded from the
+  profile and benchmark name, so each benchmark draws its own repeatable sequence instead
+  of every benchmark repeating the first draws of one seed.
+  """
+
+  return synthetic.SyntheticAccount(size, latency=args.latency, throttle_rate=args.throttle_rate,
+                                    seed=zlib.crc32(f"{size}:{name}".encode()))
+
+
+def warm_session(account):
+  """
+  Returns a session on the account with its clients already created.
+  """
+
+  session = account.session()
+  for service in SERVICES:
+    clients.get_client(session, service, synthetic.REGION)
+  return session
+
+
+def measure(name, account, func):
+  """
+  Runs one benchmark against a fresh synthetic account and returns its BenchmarkResult.
+  """
+
+  if not args.no_memory:
+    tracemalloc.start()
+
+  start = time.perf_counter()
+  func()
+  wall_time = time.perf_counter() - start
+
+  peak_memory = 0
+  if not args.no_memory:
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+  api_calls = sum(account.calls.values())
+  return BenchmarkResult(name, wall_time, api_calls, sum(account.attempts.values()), sum(account.throttles.values()),
+                         peak_memory, api_calls / account.resources())
+
+
+def run_profile(size):
+  """
+  Runs every benchmark for one account size, each with its own account and session.
+  """
+
+  results = []
+  benchmarks = [(spec.name, lambda ctx, spec=spec: collectors.collect(ctx, spec)) for spec in collectors.SPECS]
+  benchmarks.append((collectors.discover_enis.__name__, collectors.discover_enis))
+
+  for name, collector in benchmarks:
+    account = new_account(size, name)
+    ctx = collectors.RegionContext(synthetic.REGION, account.vpc_ids, session=warm_session(account))
+    results.append(measure(name, account, lambda: collector(ctx)))
+
+  for discovery_mode in collectors.DISCOVERY_MODES:
+    account = new_account(size, f"scan_region[{discovery_mode}]")
+    session = warm_session(account)
+    results.append(measure(f"scan_region[{discovery_mode}]", account,
+                           lambda: collectors.scan_region(synthetic.REGION, [], True, args.workers, session=session,
+                                                          discovery_mode=discovery_mode)))
+
+  # One VPC of many: the listings are filtered server-side (see modules\pushdown.py)
+  account = new_account(size, "scan_region[one-vpc]")
+  session = warm_session(account)
+  results.append(measure("scan_region[one-vpc]", account,
+                         lambda: collectors.scan_region(synthetic.REGION, account.vpc_ids[:1], False, args.workers,
+                                                        session=session)))
+
+  return results
+
+
+def print_results(profile, size, results):
+  logger.info(f"Profile {profile} ({size} ENIs, instances, Lambdas and ASGs):")
+  logger.info(f"{'benchmark':<28}{'wall':>9}{'calls':>8}{'attempts':>10}{'throttles':>11}{'calls/res':>11}{'peak mem':>12}")
+  for result in results:
+    logger.info(f"{result.name:<28}{result.wall_time:>8.3f}s{result.api_calls:>8}{result.attempts:>10}"
+                f"{result.throttles:>11}{result.calls_per_resource:>11.4f}{result.peak_memory / 1024:>10.0f}KB")
+  logger.info("--------------------------------------------")
+
+
+def compare(results, baseline):
+  """
+  Returns the regressions of the results against the baseline, as printable lines.
+  """
+
+  same_settings = baseline.get("settings") == settings()
+  if not same_settings:
+    logger.info(f"Baseline settings {baseline.get('settings')} differ from {settings()}, only API calls are compared")
+
+  regressions = []
+  for profile, benchmarks in results.items():
+    for name, result in benchmarks.items():
+      base = baseline.get("profiles", {}).get(profile, {}).get(name)
+      if base is None:
+        continue
+
+      if result["api_calls"] > base["api_calls"]:
+        regressions.append(f"{profile} {name}: API calls {base['api_calls']} -> {result['api_calls']}")
+
+      if same_settings:
+        for metric in ("wall_time", "peak_memory"):
+          slack = WALL_TIME_SLACK if metric == "wall_time" else 0
+          if base[metric] and result[metric] > base[metric] * (1 + args.tolerance) + slack:
+            regressions.append(f"{profile} {name}: {metric} {base[metric]:.3f} -> {result[metric]:.3f}")
+
+  return regressions
+
+#-----------------------------------------------------------[Execution]------------------------------------------------------------
+
+def main(argv=None):
+  """
+  Runs the requested profiles, then compares with (or updates) the baseline.
+  """
+
+  global args
+
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+  args = build_parser().parse_args(argv)
+
+  clients.configure(clientconfig.build_config(clientconfig.client_settings(workers=args.workers)))
+
+  results = {}
+  unthrottled = []
+  for profile in args.profiles.split(','):
+    size = PROFILES[profile] if profile in PROFILES else int(profile)
+    profile_results = run_profile(size)
+    print_results(profile, size, profile_results)
+    results[profile] = {result.name: result._asdict() for result in profile_results}
+    if args.throttle_rate > 0 and not any(result.throttles for result in profile_results):
+      unthrottled.append(profile)
+
+  # The throttling path would be silently left untested
+  for profile in unthrottled:
+    logger.error(f"Profile {profile}: --throttle-rate {args.throttle_rate} injected no throttle, raise the rate or the size")
+  if unthrottled:
+    sys.exit(1)
+
+  if args.update_baseline:
+    baseline = {"settings": settings(), "profiles": {}}
+    if os.path.exists(args.baseline):
+      with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+      if baseline.get("settings") != settings():
+        baseline = {"settings": settings(), "profiles": {}}
+
+    baseline["profiles"].update(results)
+    with open(args.baseline, "w") as baseline_file:
+      json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    logger.info(f"Baseline written to {args.baseline}")
+    return
+
+  if not os.path.exists(args.baseline):
+    logger.info(f"No baseline at {args.baseline}, run with --update-baseline to record one")
+    return
+
+  with open(args.baseline) as baseline_file:
+    regressions = compare(results, json.load(baseline_file))
+
+  for regression in regressions:
+    logger.error(f"Regression: {regression}")
+  if regressions:
+    sys.exit(1)
+  logger.info("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+#************************************************************************************
+# Script: benchmarks/startup.py
+# Description: Cold start benchmark for vpc-inside.py, its import time and wall time.
+# Python Version: 3.8.x
+#
+# Starts vpc-inside.py in a fresh interpreter with -X importtime for the
+# invocations that never reach AWS (--help, an argument error) and records for each:
+#   - wall time of the whole process
+#   - total import time (the sum of the self times -X importtime reports)
+#   - the modules that were imported
+# Every case is run several times and the fastest run is kept.
+#
+# A heavy module imported by these invocations is a regression whatever the
+# timings (boto3 and botocore are only imported once AWS is called, click only
+# when colorizing, see modules\clients.py and modules\colorprint.py), as is a wall
+# time / import time over the baseline by more than the tolerance (and
+# STARTUP_SLACK, so the interpreter's own jitter does not flap).
+#
+# Note: Run from the project root, no AWS credentials or network are used.
+#
+# EXIT STATUS:
+#     Exit codes:
+#     0 = Success
+#     1 = Regression against the baseline
+#
+# Usage: python -m benchmarks.startup [-h] [--runs RUNS] [--baseline FILE] [--update-baseline]
+#                                     [--tolerance RATE]
+#
+# Example:
+# python -m benchmarks.startup
+# python -m benchmarks.startup --runs 10 --update-baseline
+#
+#************************************************************************************
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from collections import namedtuple
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+logger = logging.getLogger()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "vpc-inside.py")
+
+# Case name -> vpc-inside.py arguments, none of them reaches AWS
+CASES = {
+  "help": ["--help"],
+  "argument-error": ["--output", "xml"],
+}
+
+# Modules these invocations must not import (top-level package names)
+FORBIDDEN = ["boto3", "botocore", "s3transfer", "click"]
+
+# Startup time growth under this many seconds is interpreter jitter, never a regression
+STARTUP_SLACK = 0.02
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+StartupResult = namedtuple("StartupResult", ["name", "wall_time", "import_time", "modules", "forbidden"])
+
+# Set by main()
+args = None
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+def build_parser():
+  """
+  Returns the argument parser for the command line.
+  """
+
+  parser = ArgumentParser(description="Cold start benchmark for vpc-inside.py")
+  parser.add_argument('--runs', type=int, default=5, help="Runs per case, the fastest is kept")
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline file to compare with")
+  parser.add_argument('--update-baseline', action='store_true', help="Write the results to the baseline file instead of comparing")
+  parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed wall time / import time growth over the baseline")
+  return parser
+
+
+def parse_importtime(stderr):
+  """
+  Returns (total import time in seconds, list of imported modules) from -X importtime output.
+  """
+
+  total = 0
+  modules = []
+  for line in stderr.splitlines():
+    if not line.startswith("import time:"):
+      continue
+    fields = line[len("import time:"):].split('|')
+    if len(fields) != 3 or not fields[0].strip().isdigit():
+      continue
+    total += int(fields[0])
+    modules.append(fields[2].strip())
+  return total / 1000000, modules
+
+
+def run_case(name, script_args):
+  """
+  Starts vpc-inside.py once per run and returns the StartupResult of the fastest run.
+  """
+
+  best = None
+  for _ in range(args.runs):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", SCRIPT] + script_args, cwd=ROOT,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wall_time = time.perf_counter() - start
+
+    import_time, modules = parse_importtime(process.stderr)
+    forbidden = sorted({module.split('.')[0] for module in modules} & set(FORBIDDEN))
+    result = StartupResult(name, wall_time, import_time, len(modules), forbidden)
+    if best is None or result.wall_time < best.wall_time:
+      best = result
+  return best
+
+
+def print_results(results):
+  logger.info(f"{'case':<20}{'wall':>9}{'imports':>10}{'modules':>9}  forbidden")
+  for result in results:
+    logger.info(f"{result.name:<20}{result.wall_time:>8.3f}s{result.import_time:>9.3f}s{result.modules:>9}  "
+                f"{', '.join(result.forbidden) or '-'}")
+  logger.info("--------------------------------------------")
+
+
+def compare(results, baseline):
+  """
+  Returns the regressions of the results against the baseline, as printable lines.
+  """
+
+  regressions = []
+  for result in results:
+    if result.forbidden:
+      regressions.append(f"{result.name}: imports {', '.join(result.forbidden)}")
+
+    base = baseline.get("cases", {}).get(result.name)
+    if base is None:
+      continue
+    for metric in ("wall_time", "import_time"):
+      value = getattr(result, metric)
+      if base[metric] and value > base[metric] * (1 + args.tolerance) + STARTUP_SLACK:
+        regressions.append(f"{result.name}: {metric} {base[metric]:.3f} -> {value:.3f}")
+
+  return regressions
+
+#-----------------------------------------------------------[Execution]------------------------------------------------------------
+
+def main(argv=None):
+  """
+  Runs every case, then compares with (or updates) the baseline.
+  """
+
+  global args
+
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+  args = build_parser().parse_args(argv)
+
+  results = [run_case(name, script_args) for name, script_args in CASES.items()]
+  print_results(results)
+
+  if args.update_baseline:
+    baseline = {"python": sys.version.split()[0],
+                "cases": {result.name: {"wall_time": result.wall_time, "import_time": result.import_time}
+                          for result in results}}
+    with open(args.baseline, "w") as baseline_file:
+      json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    logger.info(f"Baseline written to {args.baseline}")
+    return
+
+  baseline = {}
+  if os.path.exists(args.baseline):
+    with open(args.baseline) as baseline_file:
+      baseline = json.load(baseline_file)
+  else:
+    logger.info(f"No baseline at {args.baseline}, only the imports are checked")
+
+  regressions = compare(results, baseline)
+  for regression in regressions:
+    logger.error(f"Regression: {regression}")
+  if regressions:
+    sys.exit(1)
+  logger.info("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,292 @@
+# ###################################################################################
+# Script/module: benchmarks\synthetic.py
+# Description: Offline synthetic AWS account for benchmarking vpc-inside.
+# Python Version: 3.8.x
+#
+# A SyntheticAccount answers every AWS call of a boto3 session in-process,
+# with resources generated on the fly from their index (nothing is held in
+# memory but the page being returned), spread evenly across a few VPCs.
+#
+# Like botocore's Stubber the responses are plain dicts, but they are handed
+# over at the transport layer instead of before the call, so requests are
+# still serialized, retried and rate limited exactly as against AWS:
+#   - before-parameter-build builds the page the call asked for
+#   - before-send sleeps for the injected latency, then answers with an
+#     empty 200 response or, for a share of the attempts, a throttling error
+#   - after-call merges the page into the parsed (empty) response
+#
+# Every call and every attempt is counted per (service, operation).
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from benchmarks import synthetic
+#
+# account = synthetic.SyntheticAccount(size=1000, latency=0.01, throttle_rate=0.05)
+# session = account.session()
+# print(session.client('ec2').describe_vpcs()['Vpcs'])
+# print(account.calls)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import boto3
+import io
+import random
+import threading
+import time
+from collections import Counter
+from botocore.awsrequest import AWSResponse
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-west-2"
+
+# Wire protocol per service ID (as in the event names), the rest are JSON
+QUERY_SERVICES = {"auto-scaling", "rds", "elastic-load-balancing", "elastic-load-balancing-v2", "sts"}
+EC2_SERVICES = {"ec2"}
+
+# Request parameters that cap the page size
+LIMIT_KEYS = ["MaxResults", "MaxRecords", "MaxItems", "PageSize", "maxResults"]
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class RawResponse(io.BytesIO):
+  """
+  Response body in the form botocore reads it from urllib3.
+  """
+
+  def stream(self, **kwargs):
+    contents = self.read()
+    while contents:
+      yield contents
+      contents = self.read()
+
+
+class SyntheticAccount:
+  """
+  One account of a configurable size, answering the calls made by the vpc-inside collectors.
+  size is the number of ENIs, instances, Lambdas and ASGs, the other resource types scale with it.
+  """
+
+  def __init__(self, size, vpcs=4, latency=0.0, throttle_rate=0.0, seed=0):
+    self.size = size
+    self.vpc_ids = [f"vpc-{index:017x}" for index in range(vpcs)]
+    self.latency = latency
+    self.throttle_rate = throttle_rate
+    self.random = random.Random(seed)
+
+    self.counts = {
+      "instances": size,
+      "enis": size,
+      "lambdas": size,
+      "asgs": size,
+      "subnets": max(vpcs, size // 100) * 2,
+      "sgs": max(vpcs, size // 10),
+      "rdss": max(1, size // 50),
+      "elbs": max(1, size // 50),
+      "elbsV2": max(1, size // 50),
+      "nats": max(1, size // 100),
+      "vpc_epts": max(1, size // 100),
+      "ekss": max(1, size // 500),
+      "igws": vpcs,
+      "vpgws": vpcs,
+      "rtbs": vpcs * 2,
+      "acls": vpcs,
+    }
+
+    # (service name, operation) -> (kind, result key, input token, output token, default page size)
+    self.operations = {
+      ("ec2", "DescribeVpcs"): ("vpcs", "Vpcs", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeSubnets"): ("subnets", "Subnets", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeInstances"): ("instances", "Reservations", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeNetworkInterfaces"): ("enis", "NetworkInterfaces", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeNatGateways"): ("nats", "NatGateways", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeVpcEndpoints"): ("vpc_epts", "VpcEndpoints", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeInternetGateways"): ("igws", "InternetGateways", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeVpnGateways"): ("vpgws", "VpnGateways", None, None, None),
+      ("ec2", "DescribeSecurityGroups"): ("sgs", "SecurityGroups", "NextToken", "NextToken", 1000),
+      ("ec2", "DescribeRouteTables"): ("rtbs", "RouteTables", "NextToken", "NextToken", 100),
+      ("ec2", "DescribeNetworkAcls"): ("acls", "NetworkAcls", "NextToken", "NextToken", 100),
+      ("autoscaling", "DescribeAutoScalingGroups"): ("asgs", "AutoScalingGroups", "NextToken", "NextToken", 50),
+      ("lambda", "ListFunctions"): ("lambdas", "Functions", "Marker", "NextMarker", 50),
+      ("rds", "DescribeDBInstances"): ("rdss", "DBInstances", "Marker", "Marker", 100),
+      ("elb", "DescribeLoadBalancers"): ("elbs", "LoadBalancerDescriptions", "Marker", "NextMarker", 400),
+      ("elbv2", "DescribeLoadBalancers"): ("elbsV2", "LoadBalancers", "Marker", "NextMarker", 400),
+      ("eks", "ListClusters"): ("ekss", "clusters", "nextToken", "nextToken", 100),
+    }
+
+    # (service ID, operation) -> calls, attempts (calls plus retries) and throttled attempts
+    self.calls = Counter()
+    self.attempts = Counter()
+    self.throttles = Counter()
+    self.lock = threading.Lock()
+
+  def session(self):
+    """
+    Returns a boto3 session whose every call is answered by this account.
+    """
+    session = boto3.Session(aws_access_key_id="synthetic", aws_secret_access_key="synthetic", region_name=REGION)
+    session.events.register('before-parameter-build', self.on_parameter_build)
+    session.events.register_last('before-send', self.on_send)
+    session.events.register('after-call', self.on_after_call)
+    return session
+
+  def resources(self):
+    return sum(self.counts.values()) + len(self.vpc_ids)
+
+  def vpc(self, index):
+    return self.vpc_ids[index % len(self.vpc_ids)]
+
+  def subnet(self, index):
+    return f"subnet-{index % self.counts['subnets']:017x}"
+
+  #---[Handlers]---
+
+  def on_parameter_build(self, params, model, context, **kwargs):
+    context['synthetic_response'] = self.respond(model.service_model.service_name, model.name, params)
+
+  def on_send(self, request, event_name, **kwargs):
+    service_id, operation = event_name.split('.')[1:3]
+    time.sleep(self.latency)
+
+    with self.lock:
+      self.attempts[(service_id, operation)] += 1
+      throttled = self.random.random() < self.throttle_rate
+      if throttled:
+        self.throttles[(service_id, operation)] += 1
+
+    if throttled:
+      return AWSResponse(request.url, 400, self.error_headers(service_id), RawResponse(self.throttle_body(service_id)))
+    return AWSResponse(request.url, 200, {}, RawResponse(self.empty_body(service_id, operation)))
+
+  def on_after_call(self, http_response, parsed, model, context, **kwargs):
+    if http_response.status_code < 300:
+      with self.lock:
+        self.calls[(model.service_model.service_id.hyphenize(), model.name)] += 1
+      parsed.update(context.pop('synthetic_response', {}))
+
+  #---[Wire format]---
+
+  def empty_body(self, service_id, operation):
+    if service_id in EC2_SERVICES:
+      return b"<Response/>"
+    if service_id in QUERY_SERVICES:
+      return f"<{operation}Response><{operation}Result/></{operation}Response>".encode()
+    return b"{}"
+
+  def throttle_body(self, service_id):
+    if service_id in EC2_SERVICES:
+      return (b"<Response><Errors><Error><Code>RequestLimitExceeded</Code><Message>Request limit exceeded.</Message>"
+              b"</Error></Errors><RequestID>synthetic</RequestID></Response>")
+    if service_id in QUERY_SERVICES:
+      return (b"<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message>"
+              b"</Error><RequestId>synthetic</RequestId></ErrorResponse>")
+    return b'{"__type": "ThrottlingException", "message": "Rate exceeded"}'
+
+  def error_headers(self, service_id):
+    if service_id in EC2_SERVICES or service_id in QUERY_SERVICES:
+      return {}
+    return {"x-amzn-ErrorType": "ThrottlingException"}
+
+  #---[Responses]---
+
+  def respond(self, service, operation, params):
+    """
+    Returns the page of results a call asks for, as the parsed response dict.
+    """
+    if (service, operation) == ("sts", "GetCallerIdentity"):
+      return {"Account": ACCOUNT_ID}
+    if (service, operation) == ("eks", "DescribeCluster"):
+      index = int(params['name'].rsplit('-', 1)[1])
+      return {"cluster": {"name": params['name'], "resourcesVpcConfig": {"vpcId": self.vpc(index)}}}
+    if (service, operation) not in self.operations:
+      return {}
+
+    kind, result_key, input_token, output_token, page_size = self.operations[(service, operation)]
+    indexes = self.matching(kind, params)
+
+    if page_size is None:
+      return {result_key: [self.item(kind, index) for index in indexes]}
+
+    for key in LIMIT_KEYS:
+      if params.get(key):
+        page_size = min(page_size, params[key])
+
+    start = int(params.get(input_token) or 0)
+    response = {result_key: [self.item(kind, index) for index in indexes[start:start + page_size]]}
+    if start + page_size < len(indexes):
+      response[output_token] = str(start + page_size)
+    return response
+
+  def matching(self, kind, params):
+    """
+    Returns the indexes of the resources of a kind that match the call's VPC filters.
+    """
+    count = len(self.vpc_ids) if kind == "vpcs" else self.counts[kind]
+    wanted = set(params.get('VpcIds') or self.vpc_ids)
+    for ec2_filter in params.get('Filters', []):
+      if ec2_filter['Name'] in ("vpc-id", "attachment.vpc-id"):
+        wanted &= set(ec2_filter['Values'])
+
+    return [index for index in range(count) if self.vpc(index) in wanted]
+
+  def item(self, kind, index):
+    vpc = self.vpc(index)
+    subnet = self.subnet(index)
+
+    if kind == "vpcs":
+      return {"VpcId": vpc}
+    if kind == "subnets":
+      return {"SubnetId": f"subnet-{index:017x}", "VpcId": vpc}
+    if kind == "instances":
+      return {"ReservationId": f"r-{index:017x}",
+              "Instances": [{"InstanceId": f"i-{index:017x}", "VpcId": vpc, "SubnetId": subnet}]}
+    if kind == "enis":
+      return self.eni(index, vpc, subnet)
+    if kind == "asgs":
+      return {"AutoScalingGroupName": f"asg-{index}", "VPCZoneIdentifier": subnet}
+    if kind == "lambdas":
+      return {"FunctionName": f"function-{index}", "VpcConfig": {"VpcId": vpc, "SubnetIds": [subnet]}}
+    if kind == "rdss":
+      return {"DBInstanceIdentifier": f"db-{index}", "DBSubnetGroup": {"VpcId": vpc}}
+    if kind == "elbs":
+      return {"LoadBalancerName": f"elb-{index}", "VPCId": vpc}
+    if kind == "elbsV2":
+      return {"LoadBalancerArn": f"arn:aws:elasticloadbalancing:{REGION}:{ACCOUNT_ID}:loadbalancer/app/alb-{index}/{index:016x}",
+              "VpcId": vpc}
+    if kind == "nats":
+      return {"NatGatewayId": f"nat-{index:017x}", "VpcId": vpc}
+    if kind == "vpc_epts":
+      return {"VpcEndpointId": f"vpce-{index:017x}", "VpcId": vpc}
+    if kind == "ekss":
+      return f"cluster-{index}"
+    if kind == "igws":
+      return {"InternetGatewayId": f"igw-{index:017x}", "Attachments": [{"VpcId": vpc}]}
+    if kind == "vpgws":
+      return {"VpnGatewayId": f"vgw-{index:017x}", "VpcAttachments": [{"VpcId": vpc}]}
+    if kind == "sgs":
+      return {"GroupId": f"sg-{index:017x}", "VpcId": vpc}
+    if kind == "rtbs":
+      return {"RouteTableId": f"rtb-{index:017x}", "VpcId": vpc}
+    if kind == "acls":
+      return {"NetworkAclId": f"acl-{index:017x}", "VpcId": vpc}
+
+  def eni(self, index, vpc, subnet):
+    """
+    A mix of instance, Lambda and load balancer ENIs, so ENI discovery has something to classify.
+    """
+    eni = {"NetworkInterfaceId": f"eni-{index:017x}", "VpcId": vpc, "SubnetId": subnet, "InterfaceType": "interface"}
+    if index % 4 == 0:
+      eni.update(InterfaceType="lambda", RequesterId="lambda",
+                 Description=f"AWS Lambda VPC ENI-function-{index}-00000000-0000-0000-0000-{index:012x}")
+    elif index % 4 == 1:
+      eni.update(RequesterId="amazon-elb", Description=f"ELB app/alb-{index}/{index:016x}")
+    else:
+      eni.update(Description="", Attachment={"InstanceId": f"i-{index:017x}"})
+    return eni
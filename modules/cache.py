@@ -0,0 +1,344 @@
+# ###################################################################################
+# Script/module: modules\cache.py
+# Description: Persistent on-disk inventory cache (single SQLite file).
+# Python Version: 3.8.x
+#
+# Listings are cached per (account, region, service, operation, parameters),
+# each with its own TTL: EKS clusters and RDS instances change rarely, ENIs
+# change often. A repeated lookup inside the TTL streams the cached pages back
+# from disk without making an API call.
+#
+# The subnet index is never kept longer than the ASG and Lambda listings
+# mapped to VPCs through it (see TTL_DEPENDENTS).
+#
+# The VPC lookup is only kept for a minute, and a requested VPC missing from
+# a cached lookup is looked up again (see refetch()), so a new VPC is never
+# reported "not found" because of the cache.
+#
+# Pages are written as they stream in and only become visible once the whole
+# listing has been read, so an interrupted listing is never served from cache.
+# Listings past their TTL are deleted whenever the cache is opened.
+# Every fetch uses its own SQLite connection (WAL mode), which keeps concurrent
+# collector threads and fleet worker processes from blocking each other.
+#
+# The cache also keeps a memo of attributes that can never change, such as the
+# VPC of an EKS cluster: per listed item, what its (per item) describe call
+# gave, so repeat runs need just the list call. A memo entry is dropped when its
+# item is no longer listed, and is re-validated after the TTL of the describe
+# call (a day for describe_cluster).
+# Note: Listings only give the item's name, so an item deleted and recreated
+# under the same name between two runs keeps its memoized attributes until
+# the memo entry expires (Example: an EKS cluster recreated in another VPC).
+#
+# Note: Items go through JSON, so timestamps come back from the cache as strings.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import cache
+#
+# inventory_cache = cache.InventoryCache(ttls=cache.parse_ttls([cache.parse_ttl("eks=86400")]), refresh=["ec2"])
+# account = inventory_cache.account_for(session)
+# for function in inventory_cache.paginate(account, "us-west-2", "lambda", lambda: lambda_client, 'list_functions', 'Functions'):
+#   print(function['FunctionName'])
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from argparse import ArgumentTypeError
+from contextlib import closing
+
+# Custom Modules:
+from modules import clients
+from modules import pagination as pg
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Cache file used when --cache-file is not given
+DEFAULT_CACHE_FILE = os.path.expanduser("~/.vpc-inside-cache.sqlite")
+
+# TTL in seconds per "service:operation" or "service", see InventoryCache.ttl()
+DEFAULT_TTLS = {
+  "default": 300,
+  "eks": 3600,
+  "rds": 3600,
+  "elb": 900,
+  "elbv2": 900,
+  "lambda": 900,
+  "autoscaling": 300,
+  "ec2": 300,
+  "ec2:describe_vpcs": 60,
+  "ec2:describe_subnets": 300,
+  "ec2:describe_instances": 120,
+  "ec2:describe_network_interfaces": 60,
+  "eks:describe_cluster": 86400,
+}
+
+# Listings whose items are mapped to VPCs through another listing (the subnet
+# index, see collectors.get_subnet_index()). The index is never kept longer
+# than they are, and refreshing one of them refreshes it too, or a resource
+# in a new subnet would map to no VPC.
+TTL_DEPENDENTS = {
+  "ec2:describe_subnets": ["autoscaling:describe_auto_scaling_groups", "lambda:list_functions"],
+}
+
+# Pages of listings that never completed are pruned after this many seconds
+ORPHAN_PAGE_AGE = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  account TEXT, region TEXT, service TEXT, operation TEXT, params TEXT,
+  generation TEXT, fetched_at REAL,
+  PRIMARY KEY (account, region, service, operation, params)
+);
+CREATE TABLE IF NOT EXISTS pages (
+  generation TEXT, page INTEGER, items TEXT, created_at REAL,
+  PRIMARY KEY (generation, page)
+);
+CREATE TABLE IF NOT EXISTS accounts (
+  access_key TEXT PRIMARY KEY, account TEXT
+);
+CREATE TABLE IF NOT EXISTS memo (
+  account TEXT, region TEXT, service TEXT, operation TEXT, item TEXT, value TEXT, learned_at REAL DEFAULT 0,
+  PRIMARY KEY (account, region, service, operation, item)
+);
+"""
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class InventoryCache:
+  """
+  SQLite backed cache of AWS listings with per-service TTLs.
+  """
+
+  def __init__(self, path=None, ttls=None, refresh=None):
+    self.path = path or DEFAULT_CACHE_FILE
+    self.ttls = dict(DEFAULT_TTLS)
+    self.ttls.update(ttls or {})
+
+    # "service" or "service:operation" entries that are always re-fetched ("all" for everything)
+    self.refresh = set(refresh or [])
+
+    with closing(self.connect()) as conn, conn:
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.executescript(SCHEMA)
+      # Memo entries of cache files made before learned_at are all re-validated
+      if "learned_at" not in {column[1] for column in conn.execute("PRAGMA table_info(memo)")}:
+        conn.execute("ALTER TABLE memo ADD COLUMN learned_at REAL DEFAULT 0")
+      self.prune(conn)
+
+  def prune(self, conn):
+    """
+    Deletes the listings past their TTL and their pages, then the pages of
+    listings that never completed and the expired memo entries, so the file
+    does not grow with every new set of VPC filters.
+    """
+    now = time.time()
+    expired = [(generation,) for service, operation, generation, fetched_at in
+               conn.execute("SELECT service, operation, generation, fetched_at FROM entries")
+               if now - fetched_at >= self.ttl(service, operation)]
+    conn.executemany("DELETE FROM entries WHERE generation = ?", expired)
+    conn.executemany("DELETE FROM pages WHERE generation = ?", expired)
+    conn.execute("DELETE FROM pages WHERE created_at < ? AND generation NOT IN (SELECT generation FROM entries)",
+                 (now - ORPHAN_PAGE_AGE,))
+    memoized = conn.execute("SELECT DISTINCT service, operation FROM memo").fetchall()
+    conn.executemany("DELETE FROM memo WHERE service = ? AND operation = ? AND learned_at <= ?",
+                     [(service, operation, now - self.ttl(service, operation)) for service, operation in memoized])
+
+  def connect(self):
+    return sqlite3.connect(self.path, timeout=30)
+
+  def execute(self, sql, params=()):
+    """
+    Runs one statement on a short-lived connection and returns the first row.
+    """
+    with closing(self.connect()) as conn, conn:
+      return conn.execute(sql, params).fetchone()
+
+  def ttl(self, service, operation):
+    """
+    Returns the TTL of an operation: its own, else its service's, else the
+    default, but never longer than the TTL of a listing that depends on it.
+    """
+    ttl = next(self.ttls[key] for key in (f"{service}:{operation}", service, "default") if key in self.ttls)
+    for dependent in TTL_DEPENDENTS.get(f"{service}:{operation}", []):
+      ttl = min(ttl, self.ttl(*dependent.split(':')))
+    return ttl
+
+  def refreshing(self, service, operation):
+    dependents = TTL_DEPENDENTS.get(f"{service}:{operation}", [])
+    return (bool(self.refresh & {"all", service, f"{service}:{operation}"})
+            or any(self.refreshing(*dependent.split(':')) for dependent in dependents))
+
+  def account_for(self, session):
+    """
+    Returns the account ID of a session's credentials, remembered per access key
+    so only the first run with a set of credentials calls sts get_caller_identity.
+    Raises botocore's NoCredentialsError when the session has no credentials,
+    as any AWS call would.
+    """
+    credentials = session.get_credentials()
+    if credentials is None:
+      from botocore.exceptions import NoCredentialsError
+      raise NoCredentialsError()
+    access_key = credentials.access_key
+
+    row = self.execute("SELECT account FROM accounts WHERE access_key = ?", (access_key,))
+    if row:
+      return row[0]
+
+    account = clients.get_client(session, 'sts').get_caller_identity()['Account']
+    self.execute("INSERT OR REPLACE INTO accounts VALUES (?, ?)", (access_key, account))
+    return account
+
+  def paginate(self, account, region, service, get_client, operation, result_key, **kwargs):
+    """
+    Same as pagination.paginate(), but served from the cache while the entry is fresh.
+    get_client is only called on a miss, which streams the pages from AWS and
+    stores them as they go by.
+    """
+    key = self.key(account, region, service, operation, kwargs)
+    generation = self.fresh_generation(key)
+    if generation is not None:
+      return self.cached_items(generation)
+    return self.fetch_items(key, get_client, operation, result_key, kwargs)
+
+  def fresh(self, account, region, service, operation, **kwargs):
+    """
+    Returns True if paginate() would serve the listing from the cache.
+    """
+    return self.fresh_generation(self.key(account, region, service, operation, kwargs)) is not None
+
+  def fresh_generation(self, key):
+    """
+    Returns the generation of a cached listing inside its TTL, else None.
+    """
+    service, operation = key[2:4]
+    if self.refreshing(service, operation):
+      return None
+    row = self.execute("SELECT generation, fetched_at FROM entries WHERE account = ? AND region = ? "
+                       "AND service = ? AND operation = ? AND params = ?", key)
+    if row and time.time() - row[1] < self.ttl(service, operation):
+      return row[0]
+    return None
+
+  def refetch(self, account, region, service, get_client, operation, result_key, **kwargs):
+    """
+    Same as paginate(), but always streams the items from AWS and replaces the cached listing.
+    """
+    return self.fetch_items(self.key(account, region, service, operation, kwargs), get_client, operation, result_key,
+                            kwargs)
+
+  def key(self, account, region, service, operation, kwargs):
+    return (account, region, service, operation, json.dumps(kwargs, sort_keys=True, default=str))
+
+  def cached_items(self, generation):
+    conn = self.connect()
+    try:
+      for (items,) in conn.execute("SELECT items FROM pages WHERE generation = ? ORDER BY page", (generation,)):
+        yield from json.loads(items)
+    finally:
+      conn.close()
+
+  def fetch_items(self, key, get_client, operation, result_key, kwargs):
+    generation = uuid.uuid4().hex
+    conn = self.connect()
+    try:
+      page = []
+      page_number = 0
+      for item in pg.paginate(get_client(), operation, result_key, **kwargs):
+        page.append(item)
+        if len(page) >= 100:
+          self.write_page(conn, generation, page_number, page)
+          page, page_number = [], page_number + 1
+        yield item
+
+      self.write_page(conn, generation, page_number, page)
+
+      # The listing is complete, swap it in for the previous one
+      with conn:
+        old = conn.execute("SELECT generation FROM entries WHERE account = ? AND region = ? "
+                           "AND service = ? AND operation = ? AND params = ?", key).fetchone()
+        conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", key + (generation, time.time()))
+        if old:
+          conn.execute("DELETE FROM pages WHERE generation = ?", old)
+    finally:
+      conn.close()
+
+  def write_page(self, conn, generation, page_number, page):
+    with conn:
+      conn.execute("INSERT INTO pages VALUES (?, ?, ?, ?)",
+                   (generation, page_number, json.dumps(page, default=str), time.time()))
+
+  def memo(self, account, region, service, operation):
+    """
+    Returns the memoized results of an operation inside its TTL, {item key: value}.
+    """
+    with closing(self.connect()) as conn:
+      return {item: json.loads(value) for item, value in
+              conn.execute("SELECT item, value FROM memo WHERE account = ? AND region = ? AND service = ? "
+                           "AND operation = ? AND learned_at > ?",
+                           (account, region, service, operation, time.time() - self.ttl(service, operation)))}
+
+  def update_memo(self, account, region, service, operation, listed, learned):
+    """
+    Memoizes the learned {item key: value} and forgets the items that are no longer listed.
+    """
+    key = (account, region, service, operation)
+    with closing(self.connect()) as conn, conn:
+      conn.executemany("INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       [key + (item, json.dumps(value, default=str), time.time()) for item, value in learned.items()])
+      known = {item for (item,) in conn.execute("SELECT item FROM memo WHERE account = ? AND region = ? "
+                                                "AND service = ? AND operation = ?", key)}
+      conn.executemany("DELETE FROM memo WHERE account = ? AND region = ? AND service = ? AND operation = ? "
+                       "AND item = ?", [key + (item,) for item in known - set(listed)])
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: parse_ttl
+def parse_ttl(value):
+  """
+  Function: parse_ttl
+  Description: Parse one --cache-ttl value, "SECONDS" for every service or "service=SECONDS"
+               / "service:operation=SECONDS" for one (the argparse type of --cache-ttl)
+  Parameters: --cache-ttl value
+  Returns: (service or service:operation, or None for every service, TTL in seconds)
+           Raises ArgumentTypeError unless the TTL is a number of seconds, 0 or more
+  """
+  name, _, seconds = value.rpartition('=')
+  try:
+    seconds = float(seconds)
+  except ValueError:
+    raise ArgumentTypeError(f"invalid TTL {value!r}, expected SECONDS or SERVICE[:OPERATION]=SECONDS")
+  if not seconds >= 0:
+    raise ArgumentTypeError(f"invalid TTL {value!r}, the TTL must be 0 or more seconds")
+  return (name or None, seconds)
+
+
+# ###################################################################################
+# Function: parse_ttls
+def parse_ttls(values):
+  """
+  Function: parse_ttls
+  Description: Merge parsed --cache-ttl values, the later ones win
+  Parameters: List of (service or service:operation or None, seconds), see parse_ttl()
+  Returns: Dictionary of TTL overrides
+  """
+  ttls = {}
+  for name, seconds in values or []:
+    if name:
+      ttls[name] = seconds
+    else:
+      # A bare number overrides every TTL
+      ttls.update({name: seconds for name in DEFAULT_TTLS})
+  return ttls
@@ -0,0 +1,158 @@
+# ###################################################################################
+# Script/module: modules\clientconfig.py
+# Description: Shared botocore client configuration for concurrent scanning.
+# Python Version: 3.8.x
+#
+# The default botocore Config pools 10 connections per client and uses legacy
+# retries. With the collectors (and regions) running in parallel that gives
+# "Connection pool is full" warnings and early failures when AWS throttles.
+# Every client is created with the one Config built here instead:
+#   - max_pool_connections sized to the worker count
+#   - adaptive retry mode (client side rate limiting on throttles)
+#   - connect and read timeouts
+#   - TCP keepalive
+#
+# Settings come from, in order of precedence: command line flags, the
+# [client] section of the config file, then the defaults below.
+#
+# Example config file (~/.vpc-inside.cfg):
+#
+# [client]
+# max_pool_connections = 32
+# retry_mode = adaptive
+# max_attempts = 10
+# connect_timeout = 5
+# read_timeout = 30
+# tcp_keepalive = yes
+#
+# Ref:
+# https://botocore.amazonaws.com/v1/documentation/api/latest/reference/config.html
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/retries.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import clientconfig
+#
+# settings = clientconfig.client_settings({"read_timeout": 60}, workers=16)
+# config = clientconfig.build_config(settings)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import os
+from configparser import ConfigParser, Error as ConfigParserError
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Config file read when --config is not given (if it exists)
+DEFAULT_CONFIG_FILE = os.path.expanduser("~/.vpc-inside.cfg")
+
+# Section of the config file holding the client settings
+CONFIG_SECTION = "client"
+
+# Default client settings, max_pool_connections=None means "the worker count"
+DEFAULTS = {
+  "max_pool_connections": None,
+  "retry_mode": "adaptive",
+  "max_attempts": 10,
+  "connect_timeout": 5,
+  "read_timeout": 30,
+  "tcp_keepalive": True,
+}
+
+# botocore retry modes (--retry-mode and retry_mode)
+RETRY_MODES = ["adaptive", "standard", "legacy"]
+
+# How each setting is read from the config file
+CONVERTERS = {
+  "max_pool_connections": ConfigParser.getint,
+  "retry_mode": ConfigParser.get,
+  "max_attempts": ConfigParser.getint,
+  "connect_timeout": ConfigParser.getfloat,
+  "read_timeout": ConfigParser.getfloat,
+  "tcp_keepalive": ConfigParser.getboolean,
+}
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: read_config_file
+def read_config_file(path=None):
+  """
+  Function: read_config_file
+  Description: Read the client settings from the [client] section of a config file
+  Parameters: Path of the config file, defaults to DEFAULT_CONFIG_FILE
+  Returns: Dictionary of the settings found in the file
+           Raises FileNotFoundError if the given file does not exist, ValueError
+           if the file cannot be parsed or holds an invalid setting
+  """
+  parser = ConfigParser()
+  try:
+    if not parser.read(path or DEFAULT_CONFIG_FILE):
+      if path:
+        raise FileNotFoundError(f"Config file not found: {path}")
+      return {}
+  except ConfigParserError as e:
+    raise ValueError(f"Invalid config file {path or DEFAULT_CONFIG_FILE}: {e}")
+
+  if not parser.has_section(CONFIG_SECTION):
+    return {}
+
+  settings = {}
+  for name, convert in CONVERTERS.items():
+    if not parser.has_option(CONFIG_SECTION, name):
+      continue
+    try:
+      settings[name] = convert(parser, CONFIG_SECTION, name)
+    except ValueError as e:
+      raise ValueError(f"Invalid {name} in {path or DEFAULT_CONFIG_FILE}: {e}")
+
+  if settings.get("retry_mode", RETRY_MODES[0]) not in RETRY_MODES:
+    raise ValueError(f"Invalid retry_mode in {path or DEFAULT_CONFIG_FILE}: {settings['retry_mode']!r} "
+                     f"(choose from {', '.join(RETRY_MODES)})")
+  return settings
+
+
+# ###################################################################################
+# Function: client_settings
+def client_settings(overrides=None, config_file=None, workers=None):
+  """
+  Function: client_settings
+  Description: Merge the defaults, the config file and the command line overrides
+  Parameters: Dictionary of overrides, None values are ignored
+              Path of the config file
+              Worker count, used when max_pool_connections is not set
+  Returns: Dictionary of settings
+  """
+  settings = dict(DEFAULTS)
+  settings.update(read_config_file(config_file))
+  settings.update({name: value for name, value in (overrides or {}).items() if value is not None})
+
+  if settings["max_pool_connections"] is None:
+    settings["max_pool_connections"] = max(10, workers or 0)
+
+  return settings
+
+
+# ###################################################################################
+# Function: build_config
+def build_config(settings):
+  """
+  Function: build_config
+  Description: Build the botocore Config shared by every client
+  Parameters: Dictionary of settings (see client_settings)
+  Returns: botocore.config.Config
+  """
+  # Imported here so the command line is parsed without loading botocore
+  from botocore.config import Config
+
+  return Config(max_pool_connections=settings["max_pool_connections"],
+                retries={"mode": settings["retry_mode"], "max_attempts": settings["max_attempts"]},
+                connect_timeout=settings["connect_timeout"],
+                read_timeout=settings["read_timeout"],
+                tcp_keepalive=settings["tcp_keepalive"])
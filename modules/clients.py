@@ -0,0 +1,162 @@
+# ###################################################################################
+# Script/module: modules\clients.py
+# Description: Lazy, memoized boto3 client factory.
+# Python Version: 3.8.x
+#
+# Creating a client loads its botocore service model, which costs tens of
+# milliseconds per service. The registry only creates a client the first time
+# it is asked for and then hands back the same client for the same
+# (session, region, service), so a run only pays for the services it uses.
+#
+# Clients are cached per session with weak references, a session that is no
+# longer used drops its clients with it. Every client is created with the
+# shared botocore Config set with configure() (see modules\clientconfig.py),
+# then handed to the hooks added with add_hook() (see modules\stats.py).
+# boto3 itself is only imported by the first new_session(), so the command
+# line can be parsed (and --help printed) without loading boto3 or botocore.
+# Client creation is serialized with a lock because a boto3 Session is not
+# thread-safe, the clients themselves are.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import clients
+#
+# ec2_client = clients.get_client(session, 'ec2', 'us-west-2')
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import threading
+import weakref
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class ClientRegistry:
+  """
+  Creates boto3 clients on first use and caches them per (session, region, service).
+  """
+
+  def __init__(self):
+    # session -> {(region, service): client}
+    self._clients = weakref.WeakKeyDictionary()
+    self._lock = threading.Lock()
+
+  def client(self, session, service, region=None):
+    region = region or session.region_name
+    with self._lock:
+      session_clients = self._clients.setdefault(session, {})
+      if (region, service) not in session_clients:
+        client = session.client(service, region_name=region, config=client_config)
+        for hook in client_hooks:
+          hook(client, session)
+        session_clients[(region, service)] = client
+      return session_clients[(region, service)]
+
+  def created(self, session):
+    """
+    Returns the (region, service) keys of the clients created for a session so far.
+    """
+    with self._lock:
+      return sorted(self._clients.get(session, {}))
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# The registry shared by the whole process
+registry = ClientRegistry()
+
+# botocore Config every client is created with, see configure()
+client_config = None
+
+# Callables run on every new client, see add_hook()
+client_hooks = []
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: get_client
+def get_client(session, service, region=None):
+  """
+  Function: get_client
+  Description: Return the cached client for (session, region, service), creating it on first use
+  Parameters: boto3 Session
+              Service name (Example: 'ec2')
+              Region name, defaults to the session's region
+  Returns: boto3 client
+  """
+  return registry.client(session, service, region)
+
+
+# ###################################################################################
+# Function: new_session
+def new_session(**kwargs):
+  """
+  Function: new_session
+  Description: Return a new boto3 Session, importing boto3 on first use
+  Parameters: boto3.Session keyword arguments (Example: region_name='us-west-2')
+  Returns: boto3 Session
+  """
+  import boto3
+  return boto3.Session(**kwargs)
+
+
+# ###################################################################################
+# Function: configure
+def configure(config):
+  """
+  Function: configure
+  Description: Set the botocore Config used for every client created from now on
+  Parameters: botocore.config.Config (or None for the botocore defaults)
+  Returns: None
+  """
+  global client_config
+  client_config = config
+
+
+# ###################################################################################
+# Function: add_hook
+def add_hook(hook):
+  """
+  Function: add_hook
+  Description: Run a callable on every client created from now on (Example: to register event handlers)
+  Parameters: Callable taking the new client and the session it was created from
+  Returns: None
+  """
+  client_hooks.append(hook)
+
+
+# ###################################################################################
+# Function: reset
+def reset():
+  """
+  Function: reset
+  Description: Drop every cached client, used in forked worker processes so they
+               never share a parent's connection pools. The Config and hooks are kept.
+  Parameters: None
+  Returns: None
+  """
+  global registry
+  registry = ClientRegistry()
+
+
+# ###################################################################################
+# Function: aws_error
+def aws_error(error):
+  """
+  Function: aws_error
+  Description: Tell AWS errors (a ClientError, or a BotoCoreError such as
+               EndpointConnectionError, ReadTimeoutError or NoCredentialsError),
+               which are reported per region and per collector, from bugs
+  Parameters: Exception
+  Returns: (error code, message) of an AWS error, None for any other exception
+  """
+  from botocore.exceptions import BotoCoreError, ClientError
+  if isinstance(error, ClientError):
+    return (error.response['Error']['Code'], error.response['Error']['Message'])
+  if isinstance(error, BotoCoreError):
+    return (type(error).__name__, str(error))
+  return None
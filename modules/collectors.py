@@ -0,0 +1,632 @@
+# ###################################################################################
+# Script/module: modules\collectors.py
+# Description: The vpc-inside resource collectors.
+# Python Version: 3.8.x
+#
+# Each resource type is a ResourceSpec (see SPECS) saying which listing to
+# make and where the VPC and resource IDs are in its items. collect() runs a
+# spec: it lists the resources once for a region and splits the stream into
+# per-VPC buckets: {VPC ID: [resource IDs]}. Only the IDs are kept,
+# in compact IdLists (see modules\records.py), the response items are dropped
+# as soon as they have been read.
+# The collectors only return data, printing is left to the caller. A caller
+# that wants to print as the scan goes passes a ScanListener, which is told
+# about every collector as soon as it finishes.
+#
+# Every region gets its own RegionContext (session, clients and per-run state),
+# so several regions can be scanned in parallel.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import collectors
+#
+# specs = collectors.select_specs(only=["ec2", "eni"])
+# region_result = collectors.scan_region("us-west-2", ["vpc-0123456789abcdef0"], False, workers=16, specs=specs)
+# for spec, result in zip(region_result.specs, region_result.results):
+#   print(spec.title, result.result)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import functools
+import json
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# Custom Modules:
+from modules import clients
+from modules import discovery
+from modules import engine
+from modules import pagination as pg
+from modules import planner
+from modules import pushdown
+from modules import records
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class RegionContext:
+  """
+  The boto3 session, clients and per-run state used to scan one region.
+  Clients are created on first use with client() (see modules\clients.py),
+  they are thread-safe and are shared by the collector worker threads.
+  """
+
+  def __init__(self, region, vpc_ids=None, all_vpcs=False, session=None, cache=None, account=None):
+    self.region = region
+    self.session = session or clients.new_session(region_name=region)
+
+    # Optional persistent inventory cache (see modules\cache.py), keyed by account
+    self.cache = cache
+    self._account = account
+    self._account_lock = threading.Lock()
+
+    # The VPC IDs being described in this region
+    self.vpc_ids = list(vpc_ids or [])
+    self.all_vpcs = all_vpcs
+
+    # Subnet ID -> VPC ID for the subnets of the VPCs being described, see get_subnet_index()
+    self.subnet_index = None
+    self.subnet_index_lock = threading.Lock()
+
+  @property
+  def account(self):
+    with self._account_lock:
+      if self._account is None:
+        self._account = self.cache.account_for(self.session)
+    return self._account
+
+  def client(self, service):
+    return clients.get_client(self.session, service, self.region)
+
+
+class SpecSink:
+  """
+  Splits the items of a resource spec's listing into per-VPC IdLists, one item at a time.
+  Items of VPCs that are not being described are dropped.
+  """
+
+  def __init__(self, ctx, spec):
+    self.ctx = ctx
+    self.spec = spec
+    self.buckets = {vpc: records.IdList() for vpc in ctx.vpc_ids}
+
+    self.ids = compile_path(spec.id)
+    if callable(spec.vpc):
+      self.vpcs = lambda item: [spec.vpc(ctx, item)]
+    else:
+      self.vpcs = compile_path(spec.vpc)
+
+    # Listed items of a detail spec, described all at once by result()
+    self.pending = []
+
+  def add(self, item):
+    if self.spec.detail:
+      self.pending.append(item)
+      return
+
+    items = [item] if not self.spec.children else spec_items(self.ctx, self.spec, item)
+    for item in items:
+      for resource in self.ids(item):
+        for vpc in self.vpcs(item):
+          bucket = self.buckets.get(vpc)
+          if bucket is not None:
+            bucket.append(resource)
+
+  def pairs(self, item):
+    """
+    Returns the (resource ID, VPC ID) pairs of a listed item, from its description.
+    """
+    return [(resource, vpc) for detail in spec_items(self.ctx, self.spec, item)
+            for resource in self.ids(detail) for vpc in self.vpcs(detail)]
+
+  def result(self):
+    if self.pending:
+      for pairs in describe_items(self.ctx, self.spec, self.pending, self.pairs):
+        for resource, vpc in pairs:
+          bucket = self.buckets.get(vpc)
+          if bucket is not None:
+            bucket.append(resource)
+      self.pending = []
+    return self.buckets
+
+
+class DiscoverySink:
+  """
+  Attributes the ENIs of a describe_network_interfaces listing to their owners, one ENI at a time.
+  """
+
+  def __init__(self, ctx):
+    self.discovered = {vpc: {} for vpc in ctx.vpc_ids}
+
+  def add(self, item):
+    discovery.add_eni(self.discovered, item)
+
+  def result(self):
+    return self.discovered
+
+
+class ScanListener:
+  """
+  Follows a region scan as it goes, see scan_region(). Subclass it and override what is needed.
+  The methods are called from the scanning threads (several regions can be scanned at once),
+  so they must be thread-safe.
+  """
+
+  def vpcs(self, region, region_vpc_ids, vpc_ids):
+    """
+    The VPCs of a region have been listed, before any collector runs.
+    """
+
+  def task_started(self, region, name):
+    """
+    A collector task (one listing, possibly shared by several specs) has started.
+    """
+
+  def task_finished(self, region, name):
+    """
+    A collector task has finished, spec_done() follows for each of its specs.
+    """
+
+  def spec_done(self, region, spec, result):
+    """
+    A resource spec has its TaskResult, with result {VPC ID: [resource IDs]} or error set.
+    """
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Outcome of scanning one region, results holds a TaskResult per ResourceSpec in specs.
+# region_vpc_ids is every VPC of the region with --all-vpcs, else the requested VPCs found in it.
+# discovered is the TaskResult of discover_enis() with ENI discovery, else None.
+# gateway_endpoints is the TaskResult of GATEWAY_ENDPOINTS in cross-check mode, else None.
+RegionResult = namedtuple("RegionResult", ["region", "region_vpc_ids", "vpc_ids", "specs", "results", "wall_time",
+                                           "discovered", "gateway_endpoints"], defaults=[None])
+
+# Items of a detail spec described concurrently, see describe_items()
+DETAIL_WORKERS = 8
+
+# How the resources of a VPC are found:
+#   collectors  - one listing per resource type (SPECS)
+#   enis        - attribute every ENI to its owner (see modules\discovery.py)
+#   cross-check - both, so the two can be compared
+DISCOVERY_MODES = ["collectors", "enis", "cross-check"]
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+def fetch(ctx, service, operation, result_key, **kwargs):
+  """
+  Streams the items of an operation, through the inventory cache when there is one.
+  The service's client is only created if the items have to come from AWS.
+  """
+
+  if ctx.cache is None:
+    return pg.paginate(ctx.client(service), operation, result_key, **kwargs)
+  return ctx.cache.paginate(ctx.account, ctx.region, service, lambda: ctx.client(service),
+                            operation, result_key, **kwargs)
+
+
+def list_vpcs(ctx, vpc_ids=None):
+  """
+  Returns the IDs of the given VPCs that are in the region, or of every VPC in the region.
+  The VPCs are filtered server-side (a vpc-id filter, unlike VpcIds, does not
+  fail on the IDs of other regions).
+  """
+
+  kwargs = planner.fetch_kwargs(planner.Fetch('ec2', 'describe_vpcs', 'Vpcs',
+                                              pushdown.vpc_filters('ec2', 'describe_vpcs', vpc_ids)))
+  cached = ctx.cache is not None and ctx.cache.fresh(ctx.account, ctx.region, 'ec2', 'describe_vpcs', **kwargs)
+  found = [vpc['VpcId'] for vpc in fetch(ctx, 'ec2', 'describe_vpcs', 'Vpcs', **kwargs)]
+
+  # A requested VPC can be newer than a cached lookup, ask AWS before it is reported not found
+  if cached and vpc_ids and not set(vpc_ids) <= set(found):
+    found = [vpc['VpcId'] for vpc in ctx.cache.refetch(ctx.account, ctx.region, 'ec2', lambda: ctx.client('ec2'),
+                                                       'describe_vpcs', 'Vpcs', **kwargs)]
+  return found
+
+
+def list_regions(session):
+  """
+  Returns the regions enabled for the account.
+  """
+
+  regions = clients.get_client(session, 'ec2').describe_regions()['Regions']
+  return sorted(region['RegionName'] for region in regions)
+
+
+def vpc_filters(ctx, service, operation):
+  """
+  Returns the server-side filter of a listing on the VPCs being described, as Fetch
+  filters (see modules\pushdown.py). With --all-vpcs every VPC is wanted, so no filter is needed.
+  """
+
+  return pushdown.vpc_filters(service, operation, None if ctx.all_vpcs else ctx.vpc_ids)
+
+
+def fetch_filtered(ctx, service, operation, result_key, vpc_ids):
+  """
+  Streams the items of an operation, filtered server-side on the given VPCs (None for every VPC) where it can be.
+  """
+
+  return fetch(ctx, service, operation, result_key,
+               **planner.fetch_kwargs(planner.Fetch(service, operation, result_key,
+                                                    pushdown.vpc_filters(service, operation, vpc_ids))))
+
+
+def get_subnet_index(ctx):
+  """
+  Returns the subnet -> VPC index for the VPCs being described.
+  It is built once per run from a single paginated describe_subnets call,
+  so subnet ownership checks are dictionary lookups instead of API calls.
+  Subnets of other VPCs are not in it, so their resources map to no VPC.
+  """
+
+  with ctx.subnet_index_lock:
+    if ctx.subnet_index is None:
+      # The VPC IDs are interned, thousands of subnets share a handful of them
+      ctx.subnet_index = {subnet['SubnetId']: sys.intern(subnet['VpcId'])
+                          for subnet in fetch_filtered(ctx, 'ec2', 'describe_subnets', 'Subnets',
+                                                       None if ctx.all_vpcs else ctx.vpc_ids)}
+  return ctx.subnet_index
+
+
+def subnets_vpc(ctx, subnet_ids):
+  """
+  Returns the VPC the given subnets belong to, or None if none of them are known.
+  """
+
+  index = get_subnet_index(ctx)
+  for subnet in subnet_ids:
+    if subnet in index:
+      return index[subnet]
+  return None
+
+
+def asg_vpc(ctx, asg):
+  subnets_list = [subnet for subnet in asg.get('VPCZoneIdentifier', '').split(',') if subnet]
+  return subnets_vpc(ctx, subnets_list)
+
+
+def lambda_vpc(ctx, lmbd):
+  vpc_config = lmbd.get('VpcConfig', {})
+  return vpc_config.get('VpcId') or subnets_vpc(ctx, vpc_config.get('SubnetIds', []))
+
+
+def gateway_endpoint_vpc(ctx, endpoint):
+  # The other endpoint types are dropped
+  return endpoint['VpcId'] if endpoint.get('VpcEndpointType') == 'Gateway' else None
+
+
+def gateway_endpoint_ids(region_result, vpc):
+  """
+  Returns the IDs of the Gateway VPC endpoints of a VPC, empty unless the cross-check listed them.
+  """
+
+  task = region_result.gateway_endpoints
+  if task is None or task.error is not None:
+    return ()
+  return task.result[vpc]
+
+
+def subnet_items(ctx):
+  # Served from the region-wide subnet index, no extra API call
+  return ({'SubnetId': subnet, 'VpcId': subnet_vpc} for subnet, subnet_vpc in get_subnet_index(ctx).items())
+
+
+@functools.lru_cache(maxsize=None)
+def compile_path(path):
+  """
+  Returns a function giving the values at a path of an item, as a list.
+  Keys are separated by dots and a key ending in [] is a list to step into:
+  "DBSubnetGroup.VpcId", "Attachments[].VpcId".
+  """
+
+  steps = [(key[:-2], True) if key.endswith('[]') else (key, False) for key in path.split('.')]
+
+  def values(item):
+    current = [item]
+    for key, is_list in steps:
+      found = []
+      for value in current:
+        child = value.get(key) if isinstance(value, dict) else None
+        if child is None:
+          continue
+        if is_list:
+          found.extend(child)
+        else:
+          found.append(child)
+      current = found
+    return current
+
+  return values
+
+
+def spec_items(ctx, spec, item):
+  """
+  Returns the items a listed item stands for: itself, its description and/or its
+  children, if the spec says so.
+  """
+
+  items = [item]
+  if spec.detail:
+    operation, parameter, result_key = spec.detail
+    items = list(fetch(ctx, spec.service, operation, result_key, **{parameter: item}))
+
+  if spec.children:
+    items = [child for parent in items for child in parent.get(spec.children, [])]
+
+  return items
+
+
+def describe_items(ctx, spec, items, pairs):
+  """
+  Describes the listed items of a detail spec, DETAIL_WORKERS at a time.
+  What a detail spec reads from a description can never change (Example: the
+  VPC of an EKS cluster), so with the inventory cache the pairs of each item are
+  memoized until the item is no longer listed or the memo entry expires (see
+  modules\cache.py), and only new items are described.
+  Returns the pairs(item) of every item, in the order given.
+  """
+
+  operation = spec.detail[0]
+  keys = [json.dumps(item, sort_keys=True, default=str) for item in items]
+
+  memo = {}
+  if ctx.cache is not None and not ctx.cache.refreshing(spec.service, operation):
+    memo = ctx.cache.memo(ctx.account, ctx.region, spec.service, operation)
+
+  learned = {}
+  tasks = [(key, lambda item=item: pairs(item)) for key, item in zip(keys, items) if key not in memo]
+  for task in engine.run_concurrently(tasks, DETAIL_WORKERS):
+    if task.error is not None:
+      raise task.error
+    learned[task.name] = task.result
+
+  if ctx.cache is not None:
+    ctx.cache.update_memo(ctx.account, ctx.region, spec.service, operation, keys, learned)
+  memo.update(learned)
+  return [memo[key] for key in keys]
+
+
+def spec_fetch(ctx, spec):
+  """
+  Returns the listing a spec needs, with the server-side VPC filter if its operation has one.
+  """
+
+  return planner.Fetch(spec.service, spec.operation, spec.result_key, vpc_filters(ctx, spec.service, spec.operation))
+
+
+def discovery_fetch(ctx):
+  return planner.Fetch('ec2', 'describe_network_interfaces', 'NetworkInterfaces',
+                       vpc_filters(ctx, 'ec2', 'describe_network_interfaces'))
+
+
+def feed(items, sinks):
+  """
+  Streams the items once, handing each one to every sink.
+  Returns the result of each sink.
+  """
+
+  for item in items:
+    for sink in sinks:
+      sink.add(item)
+  return [sink.result() for sink in sinks]
+
+
+def fetch_into(ctx, planned_fetch, sinks):
+  return feed(fetch(ctx, planned_fetch.service, planned_fetch.operation, planned_fetch.result_key,
+                    **planner.fetch_kwargs(planned_fetch)), sinks)
+
+
+def collect(ctx, spec):
+  """
+  Runs one resource spec on its own: lists its items once for the region and
+  splits the resource IDs into per-VPC buckets.
+  Returns {VPC ID: [resource IDs]}
+  """
+
+  if spec.source:
+    return feed(spec.source(ctx), [SpecSink(ctx, spec)])[0]
+  return fetch_into(ctx, spec_fetch(ctx, spec), [SpecSink(ctx, spec)])[0]
+
+
+def discover_enis(ctx):
+  """
+  Finds the resources of every service from one paginated describe_network_interfaces.
+  Returns {VPC ID: {service: {resource: [ENI IDs]}}}
+  """
+
+  return fetch_into(ctx, discovery_fetch(ctx), [DiscoverySink(ctx)])[0]
+
+
+def select_specs(only=None, skip=None):
+  """
+  Returns the specs to run: the --only keys in the order given (else every spec), less the --skip keys.
+  Raises ValueError for an unknown key.
+  """
+
+  by_key = {spec.key: spec for spec in SPECS}
+  unknown = [key for key in (only or []) + (skip or []) if key not in by_key]
+  if unknown:
+    raise ValueError(f"Unknown resource type(s): {', '.join(unknown)} (choose from {', '.join(by_key)})")
+
+  specs = [by_key[key] for key in only] if only else list(SPECS)
+  return [spec for spec in specs if spec.key not in (skip or [])]
+
+#----------------------------------------------------------[Resource Specs]----------------------------------------------------------
+
+# How to list one type of resource and find the VPC of each:
+#   key        - name used with --only / --skip
+#   title      - section title
+#   name       - collector name, used in the timings and the benchmarks
+#   service, operation, result_key - the (paginated) listing, filtered server-side
+#                on the VPCs where the operation allows it (see modules\pushdown.py)
+#   vpc        - path of the VPC ID(s) in an item (see compile_path()), or
+#                a (ctx, item) -> VPC ID function for client-side lookups
+#   id         - path of the resource ID in an item
+#   children   - key of the child items to step into (Example: a reservation's Instances)
+#   detail     - (operation, parameter, result_key) to describe each listed item, only
+#                for attributes that never change (memoized, see describe_items())
+#   source     - (ctx) -> items function used instead of the listing
+#   cost       - rough API calls per 1000 resources, see run_specs()
+ResourceSpec = namedtuple("ResourceSpec", ["key", "title", "name", "service", "operation", "result_key", "vpc",
+                                           "id", "children", "detail", "source", "cost"],
+                          defaults=[None, None, None, 1])
+
+# Every resource type, in the order the sections are printed.
+SPECS = [
+  ResourceSpec("eks", "EKSs", "describe_ekss", 'eks', 'list_clusters', 'clusters',
+               "resourcesVpcConfig.vpcId", "name", detail=('describe_cluster', 'name', 'cluster'), cost=1000),
+  ResourceSpec("asg", "ASGs", "describe_asgs", 'autoscaling', 'describe_auto_scaling_groups', 'AutoScalingGroups',
+               asg_vpc, "AutoScalingGroupName", cost=20),
+  ResourceSpec("rds", "RDSs", "describe_rdss", 'rds', 'describe_db_instances', 'DBInstances',
+               "DBSubnetGroup.VpcId", "DBInstanceIdentifier", cost=10),
+  ResourceSpec("ec2", "EC2s", "describe_ec2s", 'ec2', 'describe_instances', 'Reservations',
+               "VpcId", "InstanceId", children='Instances'),
+  ResourceSpec("lambda", "Lambdas", "describe_lambdas", 'lambda', 'list_functions', 'Functions',
+               lambda_vpc, "FunctionName", cost=20),
+  ResourceSpec("elb", "Classic ELBs", "describe_elbs", 'elb', 'describe_load_balancers', 'LoadBalancerDescriptions',
+               "VPCId", "LoadBalancerName", cost=3),
+  ResourceSpec("elbv2", "ELBs V2", "describe_elbsV2", 'elbv2', 'describe_load_balancers', 'LoadBalancers',
+               "VpcId", "LoadBalancerArn", cost=3),
+  ResourceSpec("nat", "NAT GWs", "describe_nats", 'ec2', 'describe_nat_gateways', 'NatGateways',
+               "VpcId", "NatGatewayId"),
+  ResourceSpec("vpce", "VPC EndPoints", "describe_vpc_epts", 'ec2', 'describe_vpc_endpoints', 'VpcEndpoints',
+               "VpcId", "VpcEndpointId"),
+  ResourceSpec("igw", "IGWs", "describe_igws", 'ec2', 'describe_internet_gateways', 'InternetGateways',
+               "Attachments[].VpcId", "InternetGatewayId"),
+  # Note: describe_vpn_gateways has no paginator, paginate() makes a single call
+  ResourceSpec("vgw", "VPGWs", "describe_vpgws", 'ec2', 'describe_vpn_gateways', 'VpnGateways',
+               "VpcAttachments[].VpcId", "VpnGatewayId"),
+  ResourceSpec("eni", "ENIs", "describe_enis", 'ec2', 'describe_network_interfaces', 'NetworkInterfaces',
+               "VpcId", "NetworkInterfaceId"),
+  ResourceSpec("sg", "Security Groups", "describe_sgs", 'ec2', 'describe_security_groups', 'SecurityGroups',
+               "VpcId", "GroupId"),
+  ResourceSpec("rtb", "Routing tables", "describe_rtbs", 'ec2', 'describe_route_tables', 'RouteTables',
+               "VpcId", "RouteTableId", cost=10),
+  ResourceSpec("acl", "ACLs", "describe_acls", 'ec2', 'describe_network_acls', 'NetworkAcls',
+               "VpcId", "NetworkAclId", cost=10),
+  ResourceSpec("subnet", "Subnets", "describe_subnets", 'ec2', 'describe_subnets', 'Subnets',
+               "VpcId", "SubnetId", source=subnet_items),
+]
+
+# The Gateway VPC endpoints (S3, DynamoDB), never printed: they have no ENIs, so the
+# cross-check leaves them out (see discovery.cross_check()). Same listing as "vpce".
+GATEWAY_ENDPOINTS = ResourceSpec("vpce_gateway", "Gateway VPC EndPoints", "describe_gateway_vpc_epts", 'ec2',
+                                 'describe_vpc_endpoints', 'VpcEndpoints', gateway_endpoint_vpc, "VpcEndpointId")
+
+#----------------------------------------------------------[Scanning]----------------------------------------------------------
+
+def started_task(listener, region, name, func):
+  """
+  Tells the listener a task has started, then runs it.
+  """
+
+  listener.task_started(region, name)
+  return func()
+
+
+def run_specs(ctx, specs, workers, discover=False, listener=None):
+  """
+  Runs the specs (and the ENI discovery) on a pool of workers. The listings
+  they need are planned first (see modules\planner.py), so each merged
+  listing is made once and streamed to all of its consumers.
+  When there are more listings than workers the costliest are started first,
+  so the long listings are not left until last.
+  A ScanListener is told about each task and spec as soon as it finishes.
+  Returns (TaskResult per spec in the order given, TaskResult of the discovery or None)
+  """
+
+  needs = [(spec, spec_fetch(ctx, spec)) for spec in specs if not spec.source]
+  if discover:
+    needs.append((discover_enis, discovery_fetch(ctx)))
+
+  def sink(consumer):
+    return DiscoverySink(ctx) if consumer is discover_enis else SpecSink(ctx, consumer)
+
+  # (consumers, callable returning a result per consumer, cost)
+  groups = [(consumers, lambda planned_fetch=planned_fetch, consumers=consumers:
+                          fetch_into(ctx, planned_fetch, [sink(consumer) for consumer in consumers]),
+             max(getattr(consumer, 'cost', 1) for consumer in consumers))
+            for planned_fetch, consumers in planner.plan(needs)]
+  groups.extend(([spec], lambda spec=spec: [collect(ctx, spec)], spec.cost) for spec in specs if spec.source)
+
+  if workers < len(groups):
+    groups.sort(key=lambda group: -group[2])
+
+  tasks = [("+".join(consumer.__name__ if consumer is discover_enis else consumer.name for consumer in consumers), func)
+           for consumers, func, cost in groups]
+  if listener is not None:
+    tasks = [(name, functools.partial(started_task, listener, ctx.region, name, func)) for name, func in tasks]
+
+  # Split each listing's TaskResult into one per consumer, as each listing finishes
+  consumer_results = {}
+  def done(group_index, task):
+    if listener is not None:
+      listener.task_finished(ctx.region, task.name)
+    for index, consumer in enumerate(groups[group_index][0]):
+      name = consumer.__name__ if consumer is discover_enis else consumer.name
+      result = task.result[index] if task.error is None else None
+      consumer_results[id(consumer)] = engine.TaskResult(name, result, task.error, task.elapsed)
+      if listener is not None and consumer is not discover_enis and consumer is not GATEWAY_ENDPOINTS:
+        listener.spec_done(ctx.region, consumer, consumer_results[id(consumer)])
+
+  engine.run_concurrently(tasks, workers, on_done=done)
+
+  return [consumer_results[id(spec)] for spec in specs], consumer_results.get(id(discover_enis))
+
+
+def scan_region(region, requested_vpc_ids, all_vpcs, workers, session=None, cache=None, account=None,
+                discovery_mode="collectors", specs=None, listener=None):
+  """
+  Runs the resource specs (every one by default, see select_specs()) and/or the
+  ENI discovery (see DISCOVERY_MODES) for the requested VPCs (or every VPC) of one region.
+  A session can be passed in to scan with other credentials (see modules\fleet.py),
+  and a ScanListener to follow the scan as it goes.
+  Returns a RegionResult, collectors are skipped if none of the VPCs are in the region.
+  """
+
+  start = time.perf_counter()
+  ctx = RegionContext(region, all_vpcs=all_vpcs, session=session, cache=cache, account=account)
+  specs = SPECS if specs is None else specs
+  if discovery_mode == "enis":
+    specs = []
+
+  region_vpc_ids = list_vpcs(ctx, None if all_vpcs else requested_vpc_ids)
+  if all_vpcs:
+    ctx.vpc_ids = region_vpc_ids
+  else:
+    ctx.vpc_ids = [vpc for vpc in requested_vpc_ids if vpc in region_vpc_ids]
+  if listener is not None:
+    listener.vpcs(region, region_vpc_ids, ctx.vpc_ids)
+
+  results = []
+  discovered = None
+  gateway_endpoints = None
+  if ctx.vpc_ids:
+    # The cross-check needs the Gateway VPC endpoints, planned with the VPC endpoints they are listed by
+    cross_check = discovery_mode == "cross-check" and any(spec.key == "vpce" for spec in specs)
+    results, discovered = run_specs(ctx, list(specs) + [GATEWAY_ENDPOINTS] if cross_check else specs, workers,
+                                    discover=discovery_mode != "collectors", listener=listener)
+    if cross_check:
+      gateway_endpoints = results.pop()
+
+  return RegionResult(region, region_vpc_ids, ctx.vpc_ids, specs if results else [], results,
+                      time.perf_counter() - start, discovered, gateway_endpoints)
+
+
+def scan_regions(regions, requested_vpc_ids, all_vpcs, workers, cache=None, discovery_mode="collectors", specs=None):
+  """
+  Scans several regions in parallel, one thread per region, each with its own
+  session and clients and its own pool of collector workers.
+  Returns a TaskResult per region (result is a RegionResult) in the order given.
+  """
+
+  return engine.run_concurrently([(region, lambda region=region: scan_region(region, requested_vpc_ids, all_vpcs, workers, cache=cache,
+                                                                             discovery_mode=discovery_mode, specs=specs))
+                                  for region in regions], len(regions))
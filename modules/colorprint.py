@@ -32,12 +32,31 @@
 #
 # print(cp.turn_fg_red("My Red Text") cp.turn_fg_green("My Green Text"))
 #
+# printer = cp.SectionPrinter(colorize=True)
+# printer.print([(COLOR_BRIGHT_BLUE, logging.INFO, "My Header"), (COLOR_BRIGHT_GREEN, logging.INFO, "My Line")])
+#
 # -----------------------------------------------------------------------------------
 
 
 #---------------------------------------------------------[Imports]------------------------------------------------------
 
-import click
+import importlib.util
+import logging
+import sys
+import threading
+from itertools import groupby
+
+# click is loaded lazily, on the first colorized print: it costs tens of
+# milliseconds to import and is not needed when the output is not colorized.
+# Ref: https://docs.python.org/3/library/importlib.html#implementing-lazy-imports
+if "click" in sys.modules:
+  click = sys.modules["click"]
+else:
+  _spec = importlib.util.find_spec("click")
+  _spec.loader = importlib.util.LazyLoader(_spec.loader)
+  click = importlib.util.module_from_spec(_spec)
+  sys.modules["click"] = click
+  _spec.loader.exec_module(click)
 
 #---------------------------------------------------[Colorization Initialisations]-------------------------------------------------------
 
@@ -111,6 +130,44 @@ BG_LIGHT_WHITE = '\033[107m'
 ENDC = '\033[0m'
 RESET = '\033[39m'
 
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class SectionPrinter:
+  """
+  Prints whole sections of (color, logging level, text) lines. A section is
+  rendered into one buffer, with the color applied once per run of lines of
+  the same color instead of once per line, and written in one call while
+  holding a lock, so sections printed from several threads never interleave.
+  Uncolored, each run of lines of the same level is one logger call.
+  """
+
+  def __init__(self, colorize=True, logger=None):
+    self.colorize = colorize
+    self.logger = logger or logging.getLogger()
+    self._lock = threading.Lock()
+
+  def render(self, lines):
+    """
+    Returns the colorized text of a section.
+    """
+    return "\n".join(click.style("\n".join(text for _, _, text in run), fg=color)
+                     for color, run in groupby(lines, key=lambda line: line[0]))
+
+  def print(self, lines):
+    if not lines:
+      return
+
+    if self.colorize:
+      text = self.render(lines)
+      with self._lock:
+        click.echo(text)
+      return
+
+    runs = [(level, "\n".join(text for _, _, text in run)) for level, run in groupby(lines, key=lambda line: line[1])]
+    with self._lock:
+      for level, text in runs:
+        self.logger.log(level, text)
+
 #-----------------------------------------------------------[Functions]------------------------------------------------------------
 
 # -----------------------------------------------------------------------------------
@@ -0,0 +1,221 @@
+# ###################################################################################
+# Script/module: modules\discovery.py
+# Description: ENI-driven discovery, attributes every ENI in a VPC to its owner.
+# Python Version: 3.8.x
+#
+# Almost everything that lives in a VPC does so through a network interface,
+# and each ENI's InterfaceType, RequesterId, Description and Attachment say
+# which service and which resource it belongs to. Classifying the ENIs of a
+# single paginated describe_network_interfaces call finds the resources of
+# every service at once, instead of one set of API calls per service.
+#
+# The per-service collectors can still be run alongside to cross-check the
+# result (see cross_check()). Gateway VPC endpoints have no ENIs, so they are
+# left out of the cross-check.
+#
+# Ref:
+# https://docs.aws.amazon.com/AWSEC2/latest/APIReference/API_NetworkInterface.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import discovery
+#
+# service, resource = discovery.classify_eni(eni)
+#
+# discovered = discovery.discover_enis(enis, ["vpc-0123456789abcdef0"])
+# for service, resources in discovered["vpc-0123456789abcdef0"].items():
+#   print(service, list(resources))
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import re
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Owning services, in the order they are printed
+EC2 = "EC2"
+LAMBDA = "Lambda"
+RDS = "RDS"
+CLASSIC_ELB = "Classic ELB"
+ELB_V2 = "ELB V2"
+NAT_GW = "NAT GW"
+VPC_ENDPOINT = "VPC Endpoint"
+EKS = "EKS"
+ELASTICACHE = "ElastiCache"
+EFS = "EFS"
+TRANSIT_GATEWAY = "Transit Gateway"
+GATEWAY_LB = "Gateway Load Balancer"
+DIRECTORY_SERVICE = "Directory Service"
+REDSHIFT = "Redshift"
+DMS = "DMS"
+API_GATEWAY = "API Gateway"
+GLOBAL_ACCELERATOR = "Global Accelerator"
+OTHER = "Other"
+
+SERVICES = [EC2, LAMBDA, RDS, CLASSIC_ELB, ELB_V2, NAT_GW, VPC_ENDPOINT, EKS, ELASTICACHE, EFS,
+            TRANSIT_GATEWAY, GATEWAY_LB, DIRECTORY_SERVICE, REDSHIFT, DMS, API_GATEWAY,
+            GLOBAL_ACCELERATOR, OTHER]
+
+# InterfaceType -> owning service
+INTERFACE_TYPES = {
+  "nat_gateway": NAT_GW,
+  "vpc_endpoint": VPC_ENDPOINT,
+  "gateway_load_balancer_endpoint": VPC_ENDPOINT,
+  "lambda": LAMBDA,
+  "network_load_balancer": ELB_V2,
+  "gateway_load_balancer": GATEWAY_LB,
+  "transit_gateway": TRANSIT_GATEWAY,
+  "api_gateway_managed": API_GATEWAY,
+  "global_accelerator_managed": GLOBAL_ACCELERATOR,
+}
+
+# (Description pattern, owning service), the first group is the owning resource
+DESCRIPTIONS = [
+  (re.compile(r"^Interface for NAT Gateway (nat-[0-9a-f]+)"), NAT_GW),
+  (re.compile(r"^VPC Endpoint Interface (vpce-[0-9a-f]+)"), VPC_ENDPOINT),
+  (re.compile(r"^AWS Lambda VPC ENI-(.+?)(?:-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})?$"), LAMBDA),
+  (re.compile(r"^ELB ((?:app|net)/[^/]+/[0-9a-f]+)"), ELB_V2),
+  (re.compile(r"^ELB (gwy/[^/]+/[0-9a-f]+)"), GATEWAY_LB),
+  (re.compile(r"^ELB ([^/\s]+)$"), CLASSIC_ELB),
+  (re.compile(r"^Amazon EKS (\S+)"), EKS),
+  (re.compile(r"^ElastiCache (\S+)"), ELASTICACHE),
+  (re.compile(r"^EFS mount target for (fs-[0-9a-f]+)"), EFS),
+  (re.compile(r"Transit Gateway Attachment (tgw-attach-[0-9a-f]+)"), TRANSIT_GATEWAY),
+  (re.compile(r"for directory (d-[0-9a-f]+)"), DIRECTORY_SERVICE),
+  (re.compile(r"^RDSNetworkInterface()"), RDS),
+  (re.compile(r"^RedshiftNetworkInterface()"), REDSHIFT),
+  (re.compile(r"^DMSNetworkInterface()"), DMS),
+]
+
+# RequesterId -> owning service, for ENIs whose description says nothing useful
+REQUESTERS = {
+  "amazon-rds": RDS,
+  "amazon-elb": CLASSIC_ELB,
+  "amazon-elasticache": ELASTICACHE,
+  "amazon-redshift": REDSHIFT,
+}
+
+def load_balancer_name(arn):
+  # "arn:aws:elasticloadbalancing:...:loadbalancer/app/name/id" -> "app/name/id", as in the ENI descriptions
+  return arn.split(":loadbalancer/", 1)[-1]
+
+
+# Discovered service -> (collector title, normalizer of the collector's IDs, filter
+# of the normalized IDs or None), see cross_check().
+# The ELBs V2 collector lists the Gateway Load Balancers as well (gwy/ names).
+CROSS_CHECKS = {
+  EC2: ("EC2s", None, None),
+  LAMBDA: ("Lambdas", None, None),
+  CLASSIC_ELB: ("Classic ELBs", None, None),
+  ELB_V2: ("ELBs V2", load_balancer_name, lambda name: not name.startswith("gwy/")),
+  GATEWAY_LB: ("ELBs V2", load_balancer_name, lambda name: name.startswith("gwy/")),
+  NAT_GW: ("NAT GWs", None, None),
+  VPC_ENDPOINT: ("VPC EndPoints", None, None),
+  EKS: ("EKSs", None, None),
+}
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: classify_eni
+def classify_eni(eni):
+  """
+  Function: classify_eni
+  Description: Attribute an ENI to the service and resource that own it, from its
+               Description, then its Attachment, InterfaceType and RequesterId.
+  Parameters: NetworkInterface dict (from describe_network_interfaces)
+  Returns: (service, resource), resource is None when only the service is known
+  """
+  description = eni.get('Description', '')
+  interface_type = eni.get('InterfaceType', 'interface')
+
+  for pattern, service in DESCRIPTIONS:
+    match = pattern.search(description)
+    if match:
+      return service, match.group(1) or None
+
+  attachment = eni.get('Attachment', {})
+  if attachment.get('InstanceId'):
+    return EC2, attachment['InstanceId']
+
+  if interface_type in INTERFACE_TYPES:
+    return INTERFACE_TYPES[interface_type], None
+
+  requester = eni.get('RequesterId', '')
+  if requester in REQUESTERS:
+    return REQUESTERS[requester], None
+
+  return OTHER, None
+
+
+# ###################################################################################
+# Function: discover_enis
+def discover_enis(enis, vpc_ids):
+  """
+  Function: discover_enis
+  Description: Classify a stream of ENIs in one pass, ENIs whose resource is unknown
+               are listed under their own ENI ID. ENIs of other VPCs are dropped.
+  Parameters: Iterable of NetworkInterface dicts
+              VPC IDs being described
+  Returns: {VPC ID: {service: {resource: [ENI IDs]}}}
+  """
+  discovered = {vpc: {} for vpc in vpc_ids}
+  for eni in enis:
+    add_eni(discovered, eni)
+  return discovered
+
+
+# ###################################################################################
+# Function: add_eni
+def add_eni(discovered, eni):
+  """
+  Function: add_eni
+  Description: Classify one ENI into the result of discover_enis(), dropped if it is in another VPC
+  Parameters: {VPC ID: {service: {resource: [ENI IDs]}}}
+              NetworkInterface dict
+  Returns: None
+  """
+  services = discovered.get(eni.get('VpcId'))
+  if services is None:
+    return
+
+  service, resource = classify_eni(eni)
+  eni_id = eni['NetworkInterfaceId']
+  services.setdefault(service, {}).setdefault(resource or eni_id, []).append(eni_id)
+
+
+# ###################################################################################
+# Function: cross_check
+def cross_check(discovered_services, collector_buckets, gateway_endpoints=()):
+  """
+  Function: cross_check
+  Description: Compare the resources discovered from the ENIs of one VPC with
+               what the per-service collectors found in it. Gateway VPC endpoints
+               have no ENIs, they are left out of the VPC endpoints.
+  Parameters: {service: {resource: [ENI IDs]}} of the VPC
+              {collector title: [resource IDs]} of the VPC
+              IDs of the Gateway VPC endpoints of the VPC (see collectors.GATEWAY_ENDPOINTS)
+  Returns: List of (service, resource, "ENIs only" or "collector only")
+  """
+  mismatches = []
+  for service, (title, normalize, keep) in CROSS_CHECKS.items():
+    if title not in collector_buckets:
+      continue
+
+    collected = {normalize(resource) if normalize else resource for resource in collector_buckets[title]}
+    if keep:
+      collected = {resource for resource in collected if keep(resource)}
+    if service == VPC_ENDPOINT:
+      collected -= set(gateway_endpoints)
+    discovered = set(discovered_services.get(service, {}))
+
+    mismatches.extend((service, resource, "ENIs only") for resource in sorted(discovered - collected))
+    mismatches.extend((service, resource, "collector only") for resource in sorted(collected - discovered))
+
+  return mismatches
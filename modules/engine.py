@@ -0,0 +1,85 @@
+# ###################################################################################
+# Script/module: modules\engine.py
+# Description: Concurrent execution engine for the vpc-inside collectors.
+# Python Version: 3.8.x
+#
+# The collectors spend nearly all of their time waiting on AWS round trips, so
+# running them on a bounded thread pool brings the wall time of a run down to
+# roughly the time of the slowest collector.
+#
+# An on_done callback is told about each task as soon as it finishes, so the
+# caller can act on the fast tasks (Example: print them) while the slow ones
+# are still running.
+#
+# Note: boto3 clients are thread-safe and can be shared between the workers,
+# boto3 Sessions and Resources are not - create those on the calling thread.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import engine
+#
+# results = engine.run_concurrently([("describe_ec2s", describe_ec2s)], workers=4)
+# for result in results:
+#   print(result.name, result.elapsed)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Outcome of one task: exactly one of result / error is set.
+TaskResult = namedtuple("TaskResult", ["name", "result", "error", "elapsed"])
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: timed_call
+def timed_call(name, func, *args, **kwargs):
+  """
+  Function: timed_call
+  Description: Run func and time it, capturing any exception instead of raising it
+  Parameters: Task name
+              Callable to run
+              Positional and keyword arguments for the callable
+  Returns: TaskResult
+  """
+  start = time.perf_counter()
+  try:
+    result = func(*args, **kwargs)
+  except Exception as e:
+    return TaskResult(name, None, e, time.perf_counter() - start)
+  return TaskResult(name, result, None, time.perf_counter() - start)
+
+
+# ###################################################################################
+# Function: run_concurrently
+def run_concurrently(tasks, workers, on_done=None):
+  """
+  Function: run_concurrently
+  Description: Run (name, callable) tasks on a bounded thread pool
+  Parameters: List of (name, callable) tuples
+              Maximum number of worker threads
+              Optional callable, called on the calling thread with (index, TaskResult)
+              as each task finishes, in the order they finish
+  Returns: List of TaskResult in the same order as tasks
+  """
+  tasks = list(tasks)
+  if not tasks:
+    return []
+
+  with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+    futures = [pool.submit(timed_call, name, func) for name, func in tasks]
+    if on_done is not None:
+      indexes = {future: index for index, future in enumerate(futures)}
+      for future in as_completed(futures):
+        on_done(indexes[future], future.result())
+    return [future.result() for future in futures]
@@ -0,0 +1,190 @@
+# ###################################################################################
+# Script/module: modules\fleet.py
+# Description: Multi-account fleet scan via STS AssumeRole.
+# Python Version: 3.8.x
+#
+# Replaces sourcing scripts/awsswitchrolemfa.sh by hand for every account.
+# The fleet is a worklist of (role ARN, region) items run on a process pool.
+# Each worker process assumes the role itself and caches the STS credentials
+# for the length of the run, and every result is streamed back to the caller
+# as soon as its work item finishes.
+#
+# With processes=0 the work items run one after another in the calling process,
+# so a fleet scan can be exercised against moto or a botocore Stubber.
+#
+# Ref:
+# https://docs.aws.amazon.com/STS/latest/APIReference/API_AssumeRole.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import fleet
+#
+# role_arns = ["arn:aws:iam::111111111111:role/vpc-inside", "arn:aws:iam::222222222222:role/vpc-inside"]
+# for fleet_result in fleet.scan_fleet(role_arns, ["us-west-2", "us-east-1"], [], True, workers=16, processes=4):
+#   print(fleet_result.account, fleet_result.region, fleet_result.task.result)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import threading
+from collections import namedtuple
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta, timezone
+
+# Custom Modules:
+from modules import clients
+from modules import collectors
+from modules import engine
+from modules import ratelimit
+from modules import stats
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Outcome of one (account, region) work item, task is a TaskResult holding a RegionResult.
+# stats holds the API calls made by the work item when recording is enabled (see modules\stats.py), else None.
+FleetResult = namedtuple("FleetResult", ["account", "role_arn", "region", "task", "stats"])
+
+# Default role session name used for AssumeRole.
+DEFAULT_SESSION_NAME = "vpc-inside"
+
+# Credentials are refreshed once they are this close to expiring.
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# Per-process cache of assumed role credentials: role ARN -> STS Credentials dict
+credentials_cache = {}
+credentials_lock = threading.Lock()
+
+# Per-process session with the ambient credentials, see sts_session()
+ambient_session = None
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+def account_id(role_arn):
+  """
+  Returns the account ID of a role ARN (arn:aws:iam::<ACCOUNT>:role/<NAME>).
+  """
+
+  return role_arn.split(':')[4]
+
+
+def read_role_arns(role_arns=None, role_arns_file=None):
+  """
+  Returns the role ARNs from a comma separated list and/or a file with one ARN per line.
+  Blank lines and lines starting with # are ignored.
+  """
+
+  arns = [arn.strip() for arn in (role_arns or '').split(',') if arn.strip()]
+
+  if role_arns_file:
+    with open(role_arns_file) as arns_file:
+      arns.extend(line.strip() for line in arns_file if line.strip() and not line.startswith('#'))
+
+  return arns
+
+
+def sts_session():
+  """
+  Returns this process's session with the ambient credentials, used to call STS.
+  """
+
+  global ambient_session
+  if ambient_session is None:
+    ambient_session = clients.new_session()
+  return ambient_session
+
+
+def assume_role_credentials(role_arn, session_name=DEFAULT_SESSION_NAME):
+  """
+  Returns STS credentials for the role, assuming it only when this process has
+  no cached credentials for it or they are about to expire.
+  """
+
+  with credentials_lock:
+    credentials = credentials_cache.get(role_arn)
+    if credentials is None or credentials['Expiration'] - datetime.now(timezone.utc) < REFRESH_MARGIN:
+      sts_client = clients.get_client(sts_session(), 'sts')
+      credentials = sts_client.assume_role(RoleArn=role_arn, RoleSessionName=session_name)['Credentials']
+      credentials_cache[role_arn] = credentials
+  return credentials
+
+
+def account_session(role_arn, region, session_name=DEFAULT_SESSION_NAME):
+  """
+  Returns a boto3 session for the region using the assumed role's credentials.
+  """
+
+  credentials = assume_role_credentials(role_arn, session_name)
+  return clients.new_session(aws_access_key_id=credentials['AccessKeyId'],
+                             aws_secret_access_key=credentials['SecretAccessKey'],
+                             aws_session_token=credentials['SessionToken'],
+                             region_name=region)
+
+
+def init_worker(client_config=None, collect_stats=False, rates=None):
+  """
+  Runs once in every worker process: start with no sessions, clients, credentials,
+  recorded calls or rate limiter state inherited from the parent process, and the
+  parent's client Config and rates (None when rate limiting is off).
+  """
+
+  global ambient_session
+  ambient_session = None
+  credentials_cache.clear()
+  clients.reset()
+  clients.configure(client_config)
+  if collect_stats:
+    stats.enable().snapshot(clear=True)
+  if rates is not None:
+    ratelimit.enable(rates)
+
+
+def scan_work_item(role_arn, region, requested_vpc_ids, all_vpcs, workers, session_name=DEFAULT_SESSION_NAME, cache=None,
+                   discovery_mode="collectors", specs=None):
+  """
+  Scans one (account, region) work item, this is what runs in the worker processes.
+  Errors (including a failed AssumeRole) are captured in the returned FleetResult,
+  with the API calls this process made since the previous work item.
+  """
+
+  def scan():
+    session = account_session(role_arn, region, session_name)
+    return collectors.scan_region(region, requested_vpc_ids, all_vpcs, workers, session=session,
+                                  cache=cache, account=account_id(role_arn), discovery_mode=discovery_mode,
+                                  specs=specs)
+
+  task = engine.timed_call(region, scan)
+  return FleetResult(account_id(role_arn), role_arn, region, task, stats.take())
+
+
+def scan_fleet(role_arns, regions, requested_vpc_ids, all_vpcs, workers, processes, session_name=DEFAULT_SESSION_NAME,
+               cache=None, discovery_mode="collectors", specs=None):
+  """
+  Scans every (role ARN, region) work item on a pool of processes.
+  Yields a FleetResult as each work item finishes, in completion order.
+  With processes=0 the work items are run in the calling process instead.
+  """
+
+  work_items = [(role_arn, region) for role_arn in role_arns for region in regions]
+
+  if processes == 0:
+    for role_arn, region in work_items:
+      yield scan_work_item(role_arn, region, requested_vpc_ids, all_vpcs, workers, session_name, cache, discovery_mode,
+                           specs)
+    return
+
+  # Imported here, it pulls in multiprocessing which only fleet mode needs
+  from concurrent.futures import ProcessPoolExecutor
+
+  with ProcessPoolExecutor(max_workers=max(1, min(processes, len(work_items))),
+                           initializer=init_worker, initargs=(clients.client_config, stats.recorder is not None,
+                                     ratelimit.limiter.rates if ratelimit.limiter else None)) as pool:
+    futures = [pool.submit(scan_work_item, role_arn, region, requested_vpc_ids, all_vpcs, workers, session_name, cache,
+                           discovery_mode, specs)
+               for role_arn, region in work_items]
+    for future in as_completed(futures):
+      yield future.result()
@@ -0,0 +1,138 @@
+# ###################################################################################
+# Script/module: modules\inventory.py
+# Description: Library API, the VPC inventory as data for other programs to use.
+# Python Version: 3.8.x
+#
+# A VpcInventory scans one region with one boto3 session and returns the
+# results instead of printing them, so it can be embedded in a long-lived
+# service: keep one VpcInventory per (account, region) and every collect()
+# reuses the same warm clients and connection pools (see modules\clients.py).
+# vpc-inside.py is a thin command line wrapper over it.
+#
+# collect() returns a collectors.RegionResult:
+#   region, region_vpc_ids, vpc_ids, wall_time
+#   specs / results - a ResourceSpec and a TaskResult per resource type, with
+#                     result {VPC ID: [resource IDs]} or error set
+#   discovered      - TaskResult of the ENI discovery, None without it
+# resources() turns it into {VPC ID: {type: [resource IDs]}}.
+#
+# Pass a collectors.ScanListener to collect() to follow a scan as it goes,
+# Example: to print each resource type as soon as it has been collected.
+#
+# collect_async() is the asyncio entry point, it runs collect() on the
+# event loop's default executor.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules.inventory import VpcInventory
+#
+# vpc_inventory = VpcInventory(boto3.Session(), "us-west-2")
+# region_result = vpc_inventory.collect(["vpc-0123456789abcdef0"], kinds=["ec2", "eni"])
+# print(vpc_inventory.resources(region_result))
+#
+# region_result = await vpc_inventory.collect_async(kinds=["sg"])    # every VPC
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import functools
+
+# Custom Modules:
+from modules import clients
+from modules import collectors
+from modules import engine
+from modules import watch
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Region used when neither the VpcInventory nor its session has one
+DEFAULT_REGION = "us-west-2"
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class VpcInventory:
+  """
+  Collects the resources inside the VPCs of one region, reusing one session and its clients.
+  """
+
+  def __init__(self, session=None, region=None, workers=16, cache=None):
+    self.region = region or (session and session.region_name) or DEFAULT_REGION
+    self.session = session or clients.new_session(region_name=self.region)
+    self.workers = workers
+
+    # Optional persistent inventory cache, see modules\cache.py
+    self.cache = cache
+
+  def collect(self, vpc_ids=None, kinds=None, skip=None, discovery_mode="collectors", listener=None):
+    """
+    Collects the resources of the given VPCs (None for every VPC in the region).
+    kinds / skip are resource type keys (see collectors.SPECS), discovery_mode one of collectors.DISCOVERY_MODES,
+    listener an optional collectors.ScanListener.
+    Returns a collectors.RegionResult. Raises ValueError for an unknown resource type.
+    """
+
+    specs = collectors.select_specs(kinds, skip)
+    return collectors.scan_region(self.region, vpc_ids or [], vpc_ids is None, self.workers, session=self.session,
+                                  cache=self.cache, discovery_mode=discovery_mode, specs=specs, listener=listener)
+
+  async def collect_async(self, vpc_ids=None, kinds=None, skip=None, discovery_mode="collectors", listener=None):
+    """
+    Same as collect(), without blocking the event loop.
+    """
+
+    # Imported here, asyncio is only needed by async callers
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    collect = functools.partial(self.collect, vpc_ids, kinds, skip, discovery_mode, listener)
+    return await loop.run_in_executor(None, collect)
+
+  def resources(self, region_result):
+    """
+    Returns the resources of a RegionResult as {VPC ID: {type: [resource IDs]}}, without the failed types.
+    """
+
+    return {vpc: {spec.key: list(result.result[vpc])
+                  for spec, result in zip(region_result.specs, region_result.results) if result.error is None}
+            for vpc in region_result.vpc_ids}
+
+  def regions(self):
+    """
+    Returns the regions enabled for the account.
+    """
+
+    return collectors.list_regions(self.session)
+
+  def watcher(self, vpc_ids=None, kinds=None, skip=None, interval=60):
+    """
+    Returns a watch.RegionWatcher for the given VPCs (None for every VPC), on this inventory's session.
+    """
+
+    return watch.RegionWatcher(self.region, vpc_ids or [], vpc_ids is None, self.workers, interval, self.session,
+                               collectors.select_specs(kinds, skip))
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: collect_all
+def collect_all(inventories, vpc_ids=None, kinds=None, skip=None, discovery_mode="collectors", listener=None):
+  """
+  Function: collect_all
+  Description: Run collect() on several inventories (Example: one per region) in parallel,
+               one thread each
+  Parameters: List of VpcInventory
+              VPC IDs, None for every VPC
+              Resource type keys to collect, None for every type
+              Resource type keys to skip
+              Discovery mode (see collectors.DISCOVERY_MODES)
+              collectors.ScanListener told about every region, None for none
+  Returns: List of TaskResult, named by region, with a RegionResult each, in the order given
+  """
+  return engine.run_concurrently([(vpc_inventory.region,
+                                   functools.partial(vpc_inventory.collect, vpc_ids, kinds, skip, discovery_mode, listener))
+                                  for vpc_inventory in inventories], len(inventories))
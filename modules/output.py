@@ -0,0 +1,283 @@
+# ###################################################################################
+# Script/module: modules\output.py
+# Description: Machine readable output, the report as a stream of flat records.
+# Python Version: 3.8.x
+#
+# With --output json, ndjson or csv the report is written to stdout as one
+# record per VPC, resource, discovered resource, cross-check mismatch, watch
+# mode change or error, every record with the same fields (see FIELDS).
+# The records are generated lazily from the region results and each one is
+# written as soon as it is made, nothing is buffered, so memory stays flat
+# however large the inventory. In a scan the records of each resource type
+# are written as soon as its collector finishes (see RecordRenderer in
+# vpc-inside.py), so a slow collector does not hold back the others.
+#
+# The colorized console report (modules\colorprint.py) is the other renderer,
+# see vpc-inside.py.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import output
+#
+# writer = output.open_writer("ndjson", sys.stdout)
+# for record in output.region_records(region_result):
+#   writer.write(record)
+# writer.close()
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import csv
+import json
+
+# Custom Modules:
+from modules import clients
+from modules import collectors
+from modules import discovery
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# The fields of every record:
+#   record  - vpc, resource, discovered, mismatch, added, removed, error or not_found
+#   account - the account ID in fleet mode, else None
+#   region, vpc     - not_found has no region, it is the requested VPC no region scanned had
+#   type    - resource type (--only key) or, for ENI discovery, the service
+#   id      - resource ID, or for an error the collector that failed
+#   detail  - ENIs of a discovered resource, which side found a mismatch, or the error
+FIELDS = ["record", "account", "region", "vpc", "type", "id", "detail"]
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class NdjsonWriter:
+  """
+  Writes one JSON object per line.
+  """
+
+  def __init__(self, stream):
+    self.stream = stream
+
+  def write(self, record):
+    self.stream.write(json.dumps(record) + "\n")
+
+  def flush(self):
+    self.stream.flush()
+
+  def close(self):
+    self.flush()
+
+
+class JsonWriter:
+  """
+  Writes a JSON array, one record at a time.
+  """
+
+  def __init__(self, stream):
+    self.stream = stream
+    self.count = 0
+
+  def write(self, record):
+    self.stream.write(("[\n" if not self.count else ",\n") + json.dumps(record))
+    self.count += 1
+
+  def flush(self):
+    self.stream.flush()
+
+  def close(self):
+    self.stream.write("\n]\n" if self.count else "[]\n")
+    self.flush()
+
+
+class CsvWriter:
+  """
+  Writes a CSV header, then one row per record.
+  """
+
+  def __init__(self, stream):
+    self.stream = stream
+    self.writer = csv.DictWriter(stream, FIELDS)
+    self.writer.writeheader()
+
+  def write(self, record):
+    self.writer.writerow(record)
+
+  def flush(self):
+    self.stream.flush()
+
+  def close(self):
+    self.flush()
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# --output format -> writer
+WRITERS = {
+  "json": JsonWriter,
+  "ndjson": NdjsonWriter,
+  "csv": CsvWriter,
+}
+
+# The --output choices, console is the colorized report
+OUTPUT_FORMATS = ["console"] + list(WRITERS)
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: open_writer
+def open_writer(output_format, stream):
+  """
+  Function: open_writer
+  Description: Return the writer of an output format
+  Parameters: Output format (Example: "ndjson")
+              Text stream to write to (Example: sys.stdout)
+  Returns: NdjsonWriter, JsonWriter or CsvWriter
+  """
+  return WRITERS[output_format](stream)
+
+
+# ###################################################################################
+# Function: make_record
+def make_record(record, account, region, vpc=None, resource_type=None, resource_id=None, detail=None):
+  """
+  Function: make_record
+  Description: Build one output record
+  Parameters: Record kind (see FIELDS), account, region, VPC, type, ID and detail
+  Returns: Dictionary with every field in FIELDS
+  """
+  return {"record": record, "account": account, "region": region, "vpc": vpc, "type": resource_type,
+          "id": resource_id, "detail": detail}
+
+
+# ###################################################################################
+# Function: region_records
+def region_records(region_result, account=None):
+  """
+  Function: region_records
+  Description: Generate the records of one region, in the order of the console report:
+               its VPCs, then per VPC the resources of every spec, the resources found
+               from the ENIs and the cross-check mismatches. Failed collectors are
+               skipped, see error_record().
+  Parameters: collectors.RegionResult
+              Account ID (fleet mode)
+  Returns: Generator of records
+  """
+  region = region_result.region
+  yield from vpc_records(region, region_result.region_vpc_ids, account)
+
+  for vpc in region_result.vpc_ids:
+    for spec, result in zip(region_result.specs, region_result.results):
+      if result.error is None:
+        yield from resource_records(region, spec, {vpc: result.result[vpc]}, account)
+    yield from discovery_records(region_result, vpc, account)
+
+
+# ###################################################################################
+# Function: vpc_records
+def vpc_records(region, region_vpc_ids, account=None):
+  """
+  Function: vpc_records
+  Description: Generate the records of the VPCs of a region
+  Parameters: Region
+              VPC IDs (RegionResult.region_vpc_ids)
+              Account ID (fleet mode)
+  Returns: Generator of vpc records
+  """
+  for vpc in region_vpc_ids:
+    yield make_record("vpc", account, region, vpc)
+
+
+# ###################################################################################
+# Function: resource_records
+def resource_records(region, spec, buckets, account=None):
+  """
+  Function: resource_records
+  Description: Generate the records of one resource type, as soon as its collector has finished
+  Parameters: Region
+              collectors.ResourceSpec
+              {VPC ID: [resource IDs]} (the collector's TaskResult.result)
+              Account ID (fleet mode)
+  Returns: Generator of resource records
+  """
+  for vpc, resources in buckets.items():
+    for resource in resources:
+      yield make_record("resource", account, region, vpc, spec.key, resource)
+
+
+# ###################################################################################
+# Function: discovery_records
+def discovery_records(region_result, vpc, account=None):
+  """
+  Function: discovery_records
+  Description: Generate the records of the resources found from the ENIs of one VPC
+               and of the cross-check mismatches, nothing without (or if it failed) ENI discovery
+  Parameters: collectors.RegionResult
+              VPC ID
+              Account ID (fleet mode)
+  Returns: Generator of discovered / mismatch records
+  """
+  discovered = region_result.discovered
+  if discovered is None or discovered.error is not None:
+    return
+
+  region = region_result.region
+  for service in discovery.SERVICES:
+    for resource, eni_ids in discovered.result[vpc].get(service, {}).items():
+      yield make_record("discovered", account, region, vpc, service, resource, len(eni_ids))
+
+  if region_result.results:
+    collector_buckets = {spec.title: result.result[vpc]
+                         for spec, result in zip(region_result.specs, region_result.results) if result.error is None}
+    gateway_endpoints = collectors.gateway_endpoint_ids(region_result, vpc)
+    for service, resource, found_by in discovery.cross_check(discovered.result[vpc], collector_buckets, gateway_endpoints):
+      yield make_record("mismatch", account, region, vpc, service, resource, found_by)
+
+
+# ###################################################################################
+# Function: change_records
+def change_records(changes):
+  """
+  Function: change_records
+  Description: Generate the records of the changes found by a watch mode poll
+  Parameters: List of watch.Change
+  Returns: Generator of added / removed records, typed by --only key ("vpc" for a VPC)
+  """
+  keys = {spec.title: spec.key for spec in collectors.SPECS}
+  for change in changes:
+    resource_type = keys.get(change.title, "vpc")
+    for resource in change.added:
+      yield make_record("added", None, change.region, change.vpc, resource_type, resource)
+    for resource in change.removed:
+      yield make_record("removed", None, change.region, change.vpc, resource_type, resource)
+
+
+# ###################################################################################
+# Function: error_record
+def error_record(name, error, account=None, region=None):
+  """
+  Function: error_record
+  Description: Build the record of a collector or region that raised an AWS error
+  Parameters: Name of what failed (Example: "describe_ekss")
+              botocore ClientError or BotoCoreError (see clients.aws_error())
+              Account ID (fleet mode)
+              Region
+  Returns: Record
+  """
+  code, message = clients.aws_error(error)
+  return make_record("error", account, region, resource_id=name, detail=f"{code}: {message}")
+
+
+# ###################################################################################
+# Function: not_found_record
+def not_found_record(vpc, regions, account=None):
+  """
+  Function: not_found_record
+  Description: Build the record of a requested VPC that is in none of the scanned regions
+  Parameters: VPC ID
+              List of the regions scanned
+              Account ID (fleet mode)
+  Returns: Record
+  """
+  return make_record("not_found", account, None, vpc, detail=f"VPC {vpc} was not found in {', '.join(regions)}")
@@ -0,0 +1,86 @@
+# ###################################################################################
+# Script/module: modules\pagination.py
+# Description: Streaming helpers for paging through AWS list/describe calls.
+# Python Version: 3.8.x
+#
+# The raw list/describe calls only return the first page of results (50 Lambdas,
+# 100 instances, ...). These helpers walk every page with the botocore paginator
+# and yield the items one at a time, so callers can filter page by page while
+# only ever holding a single page in memory. Each item is dropped from its page
+# once it has been yielded (see drain()).
+#
+# Ref:
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/paginators.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import pagination as pg
+#
+# for function in pg.paginate(lambda_client, 'list_functions', 'Functions'):
+#   print(function['FunctionName'])
+#
+# instances = pg.flatten(pg.paginate(ec2_client, 'describe_instances', 'Reservations'), 'Instances')
+#
+# -----------------------------------------------------------------------------------
+
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: paginate
+def paginate(client, operation, result_key, **kwargs):
+  """
+  Function: paginate
+  Description: Yield every item of result_key across all pages of an operation.
+               Operations that have no paginator are called once, a single
+               result (Example: describe_cluster's 'cluster') is yielded as one item.
+  Parameters: boto3 client
+              Operation name (Example: 'describe_db_instances')
+              Key of the result list in each page (Example: 'DBInstances')
+              Keyword arguments passed on to the operation
+  Returns: Generator of items
+  """
+  if not client.can_paginate(operation):
+    result = getattr(client, operation)(**kwargs).get(result_key, [])
+    if isinstance(result, dict):
+      yield result
+    else:
+      yield from result
+    return
+
+  for page in client.get_paginator(operation).paginate(**kwargs):
+    yield from drain(page.pop(result_key, []))
+
+
+# ###################################################################################
+# Function: flatten
+def flatten(items, child_key):
+  """
+  Function: flatten
+  Description: Yield the children of each item (Example: the Instances of each Reservation)
+  Parameters: Iterable of items
+              Key of the child list in each item
+  Returns: Generator of child items
+  """
+  for item in items:
+    yield from item.get(child_key, [])
+
+
+# ###################################################################################
+# Function: drain
+def drain(items):
+  """
+  Function: drain
+  Description: Yield the items of a list in order, removing each one as it is
+               yielded, so an item is freed as soon as the caller is done with it.
+               The paginator keeps the previous page alive while it fetches the
+               next one, drained pages hold nothing but their metadata by then.
+  Parameters: List of items (emptied)
+  Returns: Generator of items
+  """
+  items.reverse()
+  while items:
+    yield items.pop()
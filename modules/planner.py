@@ -0,0 +1,105 @@
+# ###################################################################################
+# Script/module: modules\planner.py
+# Description: Query planner, merges the listings the collectors need into as few calls as possible.
+# Python Version: 3.8.x
+#
+# Before a region is scanned every consumer (a resource spec, the ENI
+# discovery) states the listing it needs as a Fetch. The planner groups the
+# Fetches of the same operation and merges them:
+#   - identical Fetches are made once
+#   - Fetches that differ only in the values of the same filter are made
+#     once with the union of the values
+#   - an unfiltered Fetch subsumes the filtered ones
+# Each merged Fetch is then streamed once and every item is handed to all of
+# its consumers (see collectors.run_specs()).
+#
+# Note: a broader Fetch can return items a consumer did not ask for, so the
+# consumers must drop the items of VPCs they are not describing (as
+# collectors.SpecSink and discovery.add_eni() do).
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import planner
+#
+# needs = [("describe_enis", planner.Fetch('ec2', 'describe_network_interfaces', 'NetworkInterfaces', (("vpc-id", ("vpc-a",)),))),
+#          ("discover_enis", planner.Fetch('ec2', 'describe_network_interfaces', 'NetworkInterfaces', (("vpc-id", ("vpc-a",)),)))]
+# for fetch, consumers in planner.plan(needs):
+#   print(fetch.operation, consumers)    # describe_network_interfaces ['describe_enis', 'discover_enis']
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+from collections import namedtuple
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# One listing: filters is a tuple of (filter name, tuple of values), () for no filter.
+Fetch = namedtuple("Fetch", ["service", "operation", "result_key", "filters"])
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: fetch_kwargs
+def fetch_kwargs(fetch):
+  """
+  Function: fetch_kwargs
+  Description: Return the keyword arguments of a Fetch's API call
+  Parameters: Fetch
+  Returns: Dictionary (Example: {"Filters": [{"Name": "vpc-id", "Values": ["vpc-a"]}]})
+  """
+  if not fetch.filters:
+    return {}
+  return {"Filters": [{"Name": name, "Values": list(values)} for name, values in fetch.filters]}
+
+
+# ###################################################################################
+# Function: merge
+def merge(first, second):
+  """
+  Function: merge
+  Description: Merge two Fetches of the same operation into one that returns
+               everything either would, if there is one
+  Parameters: Fetch
+              Fetch
+  Returns: Merged Fetch, or None when they cannot be merged
+  """
+  if first.filters == second.filters:
+    return first
+  if not first.filters or not second.filters:
+    return first._replace(filters=())
+
+  if len(first.filters) == 1 and len(second.filters) == 1 and first.filters[0][0] == second.filters[0][0]:
+    name = first.filters[0][0]
+    values = tuple(sorted(set(first.filters[0][1]) | set(second.filters[0][1])))
+    return first._replace(filters=((name, values),))
+
+  return None
+
+
+# ###################################################################################
+# Function: plan
+def plan(needs):
+  """
+  Function: plan
+  Description: Merge the listings needed by the consumers into as few Fetches as possible
+  Parameters: List of (consumer, Fetch)
+  Returns: List of (Fetch, [consumers]), in the order the consumers were given
+  """
+  planned = []
+  for consumer, fetch in needs:
+    for index, (planned_fetch, consumers) in enumerate(planned):
+      if planned_fetch[:3] != fetch[:3]:
+        continue
+      merged = merge(planned_fetch, fetch)
+      if merged is not None:
+        planned[index] = (merged, consumers + [consumer])
+        break
+    else:
+      planned.append((fetch, [consumer]))
+
+  return planned
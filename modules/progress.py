@@ -0,0 +1,139 @@
+# ###################################################################################
+# Script/module: modules\progress.py
+# Description: Live progress line, the collectors still running and for how long.
+# Python Version: 3.8.x
+#
+# With --progressive each section is printed as soon as its collector
+# finishes, and below the report a status line names the collectors still
+# running with their elapsed time:
+#   Waiting for: describe_ekss 2.1s, describe_asgs 1.8s (+3 more)
+# A background thread redraws it every REFRESH_INTERVAL seconds.
+#
+# The line is only drawn when stderr is a terminal, it is never written to a
+# file or a pipe. Sections are printed through ProgressLine.print(), which
+# clears the line first and redraws it after, so the two never get mixed.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import progress
+#
+# progress_line = progress.ProgressLine(printer)    # printer is a cp.SectionPrinter
+# progress_line.start()
+# progress_line.add("describe_ekss")
+# progress_line.print(section.lines)
+# progress_line.remove("describe_ekss")
+# progress_line.stop()
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import shutil
+import sys
+import threading
+import time
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Seconds between two redraws of the line
+REFRESH_INTERVAL = 0.1
+
+# ANSI: back to the start of the line and erase it
+CLEAR_LINE = "\r\x1b[K"
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class ProgressLine:
+  """
+  A status line on stderr listing the pending tasks and their elapsed time, kept
+  below the sections printed through it.
+  """
+
+  def __init__(self, printer, stream=None):
+    self.printer = printer
+    self.stream = stream or sys.stderr
+    self.enabled = self.stream.isatty()
+
+    # Task label -> time.perf_counter() when it started, in start order
+    self.pending = {}
+    self._lock = threading.Lock()
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self):
+    if self.enabled and self._thread is None:
+      self._thread = threading.Thread(target=self.run, daemon=True)
+      self._thread.start()
+
+  def stop(self):
+    self._stopped.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+    with self._lock:
+      self.clear()
+
+  def run(self):
+    while not self._stopped.wait(REFRESH_INTERVAL):
+      with self._lock:
+        self.draw()
+
+  def add(self, label):
+    with self._lock:
+      self.pending[label] = time.perf_counter()
+      self.draw()
+
+  def remove(self, label):
+    with self._lock:
+      self.pending.pop(label, None)
+      self.draw()
+
+  def print(self, lines):
+    """
+    Prints a section (see cp.SectionPrinter) above the line.
+    """
+
+    with self._lock:
+      self.clear()
+      self.printer.print(lines)
+      self.draw()
+
+  def text(self):
+    """
+    Returns the line, cut to the terminal width, "" when nothing is pending.
+    """
+
+    if not self.pending:
+      return ""
+
+    now = time.perf_counter()
+    width = shutil.get_terminal_size().columns - 1
+    entries = [f"{label} {now - started:.1f}s" for label, started in self.pending.items()]
+    for shown in range(len(entries), 0, -1):
+      more = f" (+{len(entries) - shown} more)" if shown < len(entries) else ""
+      text = "Waiting for: " + ", ".join(entries[:shown]) + more
+      if len(text) <= width:
+        return text
+    return text[:width]
+
+  def draw(self):
+    """
+    Redraws the line. Called with the lock held.
+    """
+
+    if self.enabled and not self._stopped.is_set():
+      self.stream.write(CLEAR_LINE + self.text())
+      self.stream.flush()
+
+  def clear(self):
+    """
+    Erases the line. Called with the lock held.
+    """
+
+    if self.enabled:
+      self.stream.write(CLEAR_LINE)
+      self.stream.flush()
@@ -0,0 +1,77 @@
+# ###################################################################################
+# Script/module: modules\pushdown.py
+# Description: Which server-side filters each listing supports, so AWS does the filtering.
+# Python Version: 3.8.x
+#
+# Every listing the collectors make is filtered on the VPCs being described.
+# Where the operation has a server-side filter on the VPC ID it is used, so
+# AWS only returns (and bills the time and bytes of) the wanted items.
+# Where it has none the whole region is listed and the items of other VPCs
+# are dropped client-side (see collectors.SpecSink), which is only the fallback.
+#
+# Operations without a server-side VPC filter (client-side filtering):
+#   autoscaling describe_auto_scaling_groups - tag filters only, VPC found from the subnet index
+#   lambda      list_functions               - no filters
+#   rds         describe_db_instances        - cluster/instance/engine filters only
+#   elb/elbv2   describe_load_balancers      - names/ARNs only
+#   eks         list_clusters                - no filters
+#
+# An EC2 filter takes at most MAX_FILTER_VALUES values, past that the
+# listing is not filtered either.
+#
+# Ref:
+# https://docs.aws.amazon.com/AWSEC2/latest/APIReference/Query-Requests.html#query-filtering
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import pushdown
+#
+# filters = pushdown.vpc_filters('ec2', 'describe_subnets', ["vpc-0123456789abcdef0"])
+# print(filters)    # (('vpc-id', ('vpc-0123456789abcdef0',)),)
+# print(pushdown.vpc_filters('lambda', 'list_functions', ["vpc-0123456789abcdef0"]))    # ()
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# (service, operation) -> name of its server-side filter on the VPC ID
+VPC_FILTERS = {
+  ('ec2', 'describe_vpcs'): "vpc-id",
+  ('ec2', 'describe_subnets'): "vpc-id",
+  ('ec2', 'describe_instances'): "vpc-id",
+  ('ec2', 'describe_nat_gateways'): "vpc-id",
+  ('ec2', 'describe_vpc_endpoints'): "vpc-id",
+  ('ec2', 'describe_internet_gateways'): "attachment.vpc-id",
+  ('ec2', 'describe_vpn_gateways'): "attachment.vpc-id",
+  ('ec2', 'describe_network_interfaces'): "vpc-id",
+  ('ec2', 'describe_security_groups'): "vpc-id",
+  ('ec2', 'describe_route_tables'): "vpc-id",
+  ('ec2', 'describe_network_acls'): "vpc-id",
+}
+
+# Most values an EC2 filter accepts
+MAX_FILTER_VALUES = 200
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: vpc_filters
+def vpc_filters(service, operation, vpc_ids):
+  """
+  Function: vpc_filters
+  Description: Return the server-side filter of a listing on the given VPCs, as Fetch
+               filters (see modules\planner.py). No filter is returned when every VPC
+               is wanted, the operation has no VPC filter or there are too many VPCs.
+  Parameters: Service name (Example: 'ec2')
+              Operation name (Example: 'describe_subnets')
+              List of VPC IDs, None for every VPC
+  Returns: Tuple of (filter name, tuple of values), () for no filter
+  """
+  name = VPC_FILTERS.get((service, operation))
+  if name is None or vpc_ids is None or len(vpc_ids) > MAX_FILTER_VALUES:
+    return ()
+  return ((name, tuple(vpc_ids)),)
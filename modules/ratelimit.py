@@ -0,0 +1,238 @@
+# ###################################################################################
+# Script/module: modules\ratelimit.py
+# Description: Client-side token bucket rate limiter, per account, service and region.
+# Python Version: 3.8.x
+#
+# EC2 Describe* calls all draw from one account-level throttle bucket, so
+# fanning them out across collectors, VPCs and regions blindly ends in
+# RequestLimitExceeded storms that are slower than running them one by one.
+# Every request of every client goes through a token bucket shared by all
+# the clients of its (account, service, region):
+#   - before-send:  wait for a token (cache hits never get this far)
+#   - needs-retry:  on a throttle halve the bucket's rate and drop its tokens,
+#                   on a success step the rate back up to the configured one
+#
+# botocore's adaptive retry mode does the same per client. The buckets here
+# are shared by the clients of every session in the process with the same
+# credentials, close to what the AWS throttles are scoped to (per account
+# and region): in fleet mode every account is scanned with its own assumed
+# role credentials, so accounts scanned in one process (--fleet-workers 0)
+# never share a bucket. Two sets of credentials of the same account do not
+# share one either.
+#
+# Ref:
+# https://docs.aws.amazon.com/AWSEC2/latest/APIReference/throttling.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import ratelimit
+#
+# ratelimit.enable(ratelimit.parse_rates([ratelimit.parse_rate("ec2=10"), ratelimit.parse_rate("eks=2")]))
+# ec2_client = clients.get_client(session, 'ec2')   # every request now waits for a token
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import threading
+import time
+from argparse import ArgumentTypeError
+
+# Custom Modules:
+from modules import clients
+from modules import stats
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Requests per second per "service" (per region), see RateLimiter.bucket()
+DEFAULT_RATES = {
+  "default": 10,
+  "ec2": 20,
+  "autoscaling": 10,
+  "lambda": 10,
+  "rds": 10,
+  "elb": 10,
+  "elbv2": 10,
+  "eks": 10,
+}
+
+# Bucket sizes (the burst allowed after an idle spell), else twice the rate
+DEFAULT_BURSTS = {
+  "ec2": 100,
+}
+
+# On throttles the rate never drops below this many requests per second (or
+# below the configured rate, when that is lower)
+MIN_RATE = 0.5
+
+# On a throttle the rate is multiplied by THROTTLE_FACTOR, every success
+# adds RECOVERY_STEP of the configured rate back
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class TokenBucket:
+  """
+  Token bucket whose rate backs off on throttles and recovers on successes.
+  """
+
+  def __init__(self, rate, burst):
+    self.max_rate = rate
+    self.rate = rate
+    # acquire() waits for a whole token, a smaller bucket would never hold one
+    self.capacity = max(1, burst)
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def _refill(self):
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  def acquire(self):
+    """
+    Takes a token, waiting for one if the bucket is empty.
+    """
+    while True:
+      with self._lock:
+        self._refill()
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+  def throttled(self):
+    with self._lock:
+      self._refill()
+      self.rate = max(min(MIN_RATE, self.max_rate), self.rate * THROTTLE_FACTOR)
+      self.tokens = min(self.tokens, 0)
+
+  def succeeded(self):
+    with self._lock:
+      if self.rate < self.max_rate:
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+
+
+class RateLimiter:
+  """
+  One TokenBucket per (credentials, service, region), shared by every client of the process.
+  """
+
+  def __init__(self, rates=None):
+    self.configure(rates)
+
+  def configure(self, rates=None):
+    """
+    Sets the rates and starts over with full buckets.
+    """
+    self.rates = dict(DEFAULT_RATES)
+    self.rates.update(rates or {})
+    self.buckets = {}
+    self._lock = threading.Lock()
+
+  def bucket(self, service, region, access_key=None):
+    """
+    Returns the bucket of a (credentials, service, region), at the service's rate or else the default.
+    """
+    key = (access_key, service, region)
+    with self._lock:
+      if key not in self.buckets:
+        rate = self.rates.get(service, self.rates["default"])
+        self.buckets[key] = TokenBucket(rate, DEFAULT_BURSTS.get(service, rate * 2))
+      return self.buckets[key]
+
+  def instrument(self, client, session=None):
+    """
+    Puts every request of a client through its (credentials, service, region) bucket.
+    """
+    credentials = session.get_credentials() if session is not None else None
+    access_key = credentials.access_key if credentials is not None else None
+    bucket = self.bucket(client.meta.service_model.service_name, client.meta.region_name, access_key)
+
+    def on_before_send(**kwargs):
+      bucket.acquire()
+
+    def on_needs_retry(response=None, **kwargs):
+      if response is None:
+        return
+      if stats.is_throttle(*response):
+        bucket.throttled()
+      elif response[0].status_code < 300:
+        bucket.succeeded()
+
+    client.meta.events.register('before-send', on_before_send)
+    client.meta.events.register('needs-retry', on_needs_retry)
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# The limiter of this process, set by enable()
+limiter = None
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: enable
+def enable(rates=None):
+  """
+  Function: enable
+  Description: Rate limit every client created from now on. Called again
+               (Example: in a fleet worker process) it starts over with new buckets.
+  Parameters: Dictionary of rate overrides (see parse_rates)
+  Returns: RateLimiter
+  """
+  global limiter
+  if limiter is None:
+    limiter = RateLimiter(rates)
+    clients.add_hook(limiter.instrument)
+  else:
+    limiter.configure(rates)
+  return limiter
+
+
+# ###################################################################################
+# Function: parse_rate
+def parse_rate(value):
+  """
+  Function: parse_rate
+  Description: Parse one --rate-limit value, "RATE" for every service or
+               "service=RATE" for one (the argparse type of --rate-limit)
+  Parameters: --rate-limit value
+  Returns: (service name, or None for every service, rate in requests per second)
+           Raises ArgumentTypeError unless the rate is a positive number
+  """
+  name, _, rate = value.rpartition('=')
+  try:
+    rate = float(rate)
+  except ValueError:
+    raise ArgumentTypeError(f"invalid rate {value!r}, expected RATE or SERVICE=RATE")
+  # A zero rate never refills the bucket, a negative one would sleep for a negative time
+  if not rate > 0:
+    raise ArgumentTypeError(f"invalid rate {value!r}, the rate must be a positive number of requests per second")
+  return (name or None, rate)
+
+
+# ###################################################################################
+# Function: parse_rates
+def parse_rates(values):
+  """
+  Function: parse_rates
+  Description: Merge parsed --rate-limit values, the later ones win
+  Parameters: List of (service name or None, rate), see parse_rate()
+  Returns: Dictionary of rate overrides in requests per second
+  """
+  rates = {}
+  for name, rate in values or []:
+    if name:
+      rates[name] = rate
+    else:
+      # A bare number overrides every rate
+      rates.update({name: rate for name in DEFAULT_RATES})
+  return rates
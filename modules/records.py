@@ -0,0 +1,85 @@
+# ###################################################################################
+# Script/module: modules\records.py
+# Description: Compact storage for the resource IDs the collectors keep.
+# Python Version: 3.8.x
+#
+# A Python str costs about 50 bytes on top of its characters, and a list
+# another 8 bytes per entry, so a resource ID like "eni-0123456789abcdef0"
+# takes close to 80 bytes. An IdList keeps the IDs of one bucket back to
+# back in a single UTF-8 buffer with an array of end offsets instead, about
+# 25 bytes per ID, and only builds str objects as they are read back.
+#
+# IdList is a read-only Sequence once filled, so the callers (printing, the
+# cross-check, watch mode diffs) use it like the list it replaces.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import records
+#
+# ids = records.IdList(["i-0123456789abcdef0"])
+# ids.append("i-0fedcba9876543210")
+# print(len(ids), ids[0], list(ids))
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+from array import array
+from collections.abc import Sequence
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class IdList(Sequence):
+  """
+  Append-only list of resource IDs stored in one buffer.
+  """
+
+  __slots__ = ("_data", "_ends")
+
+  def __init__(self, ids=()):
+    self._data = bytearray()
+    # End offset of each ID in _data
+    self._ends = array('I')
+    for resource_id in ids:
+      self.append(resource_id)
+
+  def append(self, resource_id):
+    self._data += resource_id.encode()
+    self._ends.append(len(self._data))
+
+  def __len__(self):
+    return len(self._ends)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self._ends)
+    end = self._ends[index]
+    start = self._ends[index - 1] if index else 0
+    return self._data[start:end].decode()
+
+  def __iter__(self):
+    start = 0
+    data = self._data
+    for end in self._ends:
+      yield data[start:end].decode()
+      start = end
+
+  def __eq__(self, other):
+    if isinstance(other, IdList):
+      return self._ends == other._ends and self._data == other._data
+    if isinstance(other, (list, tuple)):
+      return list(self) == list(other)
+    return NotImplemented
+
+  def __repr__(self):
+    return f"IdList({list(self)!r})"
+
+  def __reduce__(self):
+    # Pickled as the IDs, for fleet worker processes
+    return (IdList, (list(self),))
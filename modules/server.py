@@ -0,0 +1,307 @@
+# ###################################################################################
+# Script/module: modules\server.py
+# Description: Local HTTP inventory service (serve mode), with warm clients and an in-memory cache.
+# Python Version: 3.8.x
+#
+# Runbooks and dashboards can query a running service instead of starting
+# vpc-inside.py for every lookup, which pays for the interpreter, the boto3
+# import, the clients and a full scan each time. The service keeps one
+# VpcInventory (one session, warm clients and connection pools) per region
+# and answers:
+#   GET /vpc/{vpc id}          every resource type of the VPC
+#   GET /vpc/{vpc id}/{type}   one resource type (Example: /vpc/vpc-0123/ec2)
+# with ?region=REGION to look in another region than the service's.
+#
+# Results are kept in memory, stale-while-revalidate:
+#   - younger than the TTL                  served as is
+#   - older, but by less than STALE_FOR     served (marked stale) while a
+#                                           background scan refreshes it
+#   - older still, or never scanned         scanned, the request waits
+# Concurrent identical requests coalesce: while a scan is in flight every
+# request for the same (region, VPC, type) waits for that one scan.
+#
+# Scans always go to AWS, the inventory cache is not used in serve mode.
+#
+# Errors are answered as JSON {"error": ...}: 400 for an unknown region,
+# 404 for an unknown path, resource type or VPC (or a type left out with
+# --only / --skip), 502 when AWS or botocore
+# failed (Example: throttling, no credentials, a timeout) and 500 for
+# anything else.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import server
+#
+# service = server.InventoryService("us-west-2", workers=16, ttl=60)
+# server.serve(("127.0.0.1", 8080), service)
+#
+# curl http://127.0.0.1:8080/vpc/vpc-0123456789abcdef0/ec2
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import json
+import logging
+import threading
+import time
+from argparse import ArgumentTypeError
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Custom Modules:
+from modules import collectors
+from modules import inventory
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Seconds a result is served as is, see InventoryService.get()
+DEFAULT_TTL = 60
+
+# Seconds past the TTL a result is still served while it is refreshed
+STALE_FOR = 600
+
+# One cached result: the response body and when it was scanned (time.time())
+Entry = namedtuple("Entry", ["body", "fetched_at"])
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class VpcNotFoundError(LookupError):
+  """
+  The requested VPC is not in the region.
+  """
+
+
+class Flight:
+  """
+  One scan in flight, every request waiting for it shares its outcome.
+  """
+
+  def __init__(self):
+    self.done = threading.Event()
+    self.entry = None
+    self.error = None
+
+
+class InventoryService:
+  """
+  Scans VPCs on request, with one VpcInventory per region, a stale-while-revalidate
+  cache and request coalescing.
+  """
+
+  def __init__(self, region, workers=16, ttl=DEFAULT_TTL, stale_for=STALE_FOR, kinds=None, skip=None, session=None):
+    self.region = region
+    self.workers = workers
+    self.ttl = ttl
+    self.stale_for = stale_for
+
+    # The resource types of /vpc/{vpc id}, from --only / --skip, /vpc/{vpc id}/{type} serves only these too
+    self.kinds = kinds
+    self.skip = skip
+    self.served_kinds = {spec.key for spec in collectors.select_specs(kinds, skip)}
+
+    # Region -> VpcInventory, created on first use
+    self.inventories = {region: inventory.VpcInventory(session, region, workers)}
+
+    # (region, VPC ID, type or None) -> Entry / Flight
+    self.entries = {}
+    self.flights = {}
+    self._lock = threading.Lock()
+
+    # The regions ?region= accepts, see known_region()
+    self.regions = None
+
+  def inventory(self, region):
+    with self._lock:
+      if region not in self.inventories:
+        self.inventories[region] = inventory.VpcInventory(None, region, self.workers)
+      return self.inventories[region]
+
+  def known_region(self, region):
+    """
+    Returns True for a region of any partition known to botocore (no API call is made).
+    """
+
+    with self._lock:
+      if self.regions is None:
+        session = self.inventories[self.region].session
+        self.regions = {self.region}
+        for partition in session.get_available_partitions():
+          self.regions.update(session.get_available_regions('ec2', partition_name=partition))
+    return region in self.regions
+
+  def get(self, region, vpc, kind=None):
+    """
+    Returns (Entry, stale) for a VPC, one resource type of it or (kind None) every type.
+    Raises VpcNotFoundError if the VPC is not in the region, or what the scan raised.
+    """
+
+    key = (region, vpc, kind)
+    with self._lock:
+      entry = self.entries.get(key)
+      # A fresh scan of every type also answers for one type it covered
+      every_type = self.entries.get((region, vpc, None))
+      if kind is not None and self.fresh(every_type) and kind in every_type.body["resources"]:
+        return self.slice(every_type, kind), False
+
+      if self.fresh(entry):
+        return entry, False
+      if entry is not None and time.time() - entry.fetched_at < self.ttl + self.stale_for:
+        self.start(key)
+        return entry, True
+      flight = self.start(key)
+
+    flight.done.wait()
+    if flight.error is not None:
+      raise flight.error
+    return flight.entry, False
+
+  def fresh(self, entry):
+    return entry is not None and time.time() - entry.fetched_at < self.ttl
+
+  def slice(self, entry, kind):
+    return Entry(dict(entry.body, kind=kind, resources=entry.body["resources"][kind], errors={}), entry.fetched_at)
+
+  def start(self, key):
+    """
+    Returns the Flight scanning a key, starting one unless it is already in flight.
+    Called with the lock held.
+    """
+
+    if key not in self.flights:
+      self.flights[key] = Flight()
+      threading.Thread(target=self.run, args=(key, self.flights[key]), daemon=True).start()
+    return self.flights[key]
+
+  def run(self, key, flight):
+    try:
+      flight.entry = self.scan(*key)
+    except Exception as e:
+      flight.error = e
+
+    with self._lock:
+      if flight.entry is not None:
+        self.entries[key] = flight.entry
+      del self.flights[key]
+    flight.done.set()
+
+  def scan(self, region, vpc, kind):
+    """
+    Scans one VPC (one type of resource, or every type) and returns its Entry.
+    """
+
+    from botocore.exceptions import ClientError
+
+    kinds, skip = ([kind], None) if kind else (self.kinds, self.skip)
+    region_result = self.inventory(region).collect([vpc], kinds, skip)
+    if not region_result.vpc_ids:
+      raise VpcNotFoundError(f"VPC {vpc} was not found in {region}")
+
+    body = {"region": region, "vpc": vpc, "resources": {}, "errors": {}}
+    if kind:
+      body["kind"] = kind
+    for spec, result in zip(region_result.specs, region_result.results):
+      if isinstance(result.error, ClientError):
+        body["errors"][spec.key] = f"{result.error.response['Error']['Code']}: {result.error.response['Error']['Message']}"
+      elif result.error is not None:
+        raise result.error
+      else:
+        body["resources"][spec.key] = list(result.result[vpc])
+    if kind:
+      body["resources"] = body["resources"].get(kind, [])
+    return Entry(body, time.time())
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+  """
+  Answers GET /vpc/{vpc id}[/{type}][?region=REGION] from the server's InventoryService.
+  """
+
+  def do_GET(self):
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    url = urlsplit(self.path)
+    parts = [part for part in url.path.split('/') if part]
+    if len(parts) not in (2, 3) or parts[0] != "vpc":
+      return self.send_json(404, {"error": "Not found, use /vpc/{vpc id} or /vpc/{vpc id}/{type}"})
+
+    service = self.server.service
+    kind = parts[2] if len(parts) == 3 else None
+    if kind is not None and kind not in {spec.key for spec in collectors.SPECS}:
+      return self.send_json(404, {"error": f"Unknown resource type {kind}"})
+    if kind is not None and kind not in service.served_kinds:
+      return self.send_json(404, {"error": f"Resource type {kind} is not served (--only / --skip)"})
+
+    region = parse_qs(url.query).get("region", [service.region])[0]
+    if not service.known_region(region):
+      return self.send_json(400, {"error": f"Unknown region {region}"})
+
+    try:
+      entry, stale = service.get(region, parts[1], kind)
+    except VpcNotFoundError as e:
+      return self.send_json(404, {"error": str(e)})
+    except ClientError as e:
+      return self.send_json(502, {"error": f"{e.response['Error']['Code']}: {e.response['Error']['Message']}"})
+    except BotoCoreError as e:
+      return self.send_json(502, {"error": f"{type(e).__name__}: {e}"})
+    except Exception as e:
+      logger.exception(f"Scanning {parts[1]} in {region} failed")
+      return self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    self.send_json(200, dict(entry.body, fetched_at=entry.fetched_at, stale=stale))
+
+  def send_json(self, status, body):
+    data = json.dumps(body).encode()
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, format, *args):
+    logger.info(f"{self.address_string()} {format % args}")
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: parse_address
+def parse_address(value):
+  """
+  Function: parse_address
+  Description: Parse a --serve value, "PORT" or "HOST:PORT"
+  Parameters: --serve value
+  Returns: (host, port), the host defaults to 127.0.0.1
+           Raises ArgumentTypeError unless the port is a number from 0 to 65535 (0 for any free port)
+  """
+  host, _, port = value.rpartition(':')
+  if not port.isdecimal() or int(port) > 65535:
+    raise ArgumentTypeError(f"invalid address {value!r}, expected PORT or HOST:PORT with a port from 0 to 65535")
+  return (host or "127.0.0.1", int(port))
+
+
+# ###################################################################################
+# Function: serve
+def serve(address, service):
+  """
+  Function: serve
+  Description: Serve the inventory over HTTP, one thread per request, until interrupted
+  Parameters: (host, port)
+              InventoryService
+  Returns: None
+  """
+  httpd = ThreadingHTTPServer(address, RequestHandler)
+  httpd.service = service
+  logger.info(f"Serving the VPC inventory on http://{address[0]}:{httpd.server_address[1]}/vpc/{{vpc id}}[/{{type}}]")
+  try:
+    httpd.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    httpd.server_close()
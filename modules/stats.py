@@ -0,0 +1,271 @@
+# ###################################################################################
+# Script/module: modules\stats.py
+# Description: API call instrumentation built on botocore's event system.
+# Python Version: 3.8.x
+#
+# When enabled, every client created by modules\clients.py gets these event
+# handlers, and per (service, operation) the recorder keeps:
+#   - before-call / after-call:  call count, errors and latency of each call
+#                                (retries and backoff included)
+#   - needs-retry:               attempts, throttled attempts and bytes received
+# Retries are the attempts that were not the first of their call.
+#
+# The recorder is per process. Fleet worker processes hand their calls back
+# with every work item (see take() and modules\fleet.py) and the caller
+# merges them, so the summary covers the whole run.
+#
+# Ref:
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/events.html
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import stats
+#
+# stats.enable()
+# ... scan ...
+# summary = stats.summary()
+# for operation in summary["operations"]:
+#   print(operation["service"], operation["operation"], operation["calls"], operation["latency"]["p90"])
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import threading
+import time
+
+# Custom Modules:
+from modules import clients
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Error codes AWS services use for throttling, a 429 status is always a throttle
+THROTTLE_CODES = {
+  "Throttling",
+  "ThrottlingException",
+  "ThrottledException",
+  "RequestThrottled",
+  "RequestThrottledException",
+  "RequestLimitExceeded",
+  "TooManyRequestsException",
+  "ProvisionedThroughputExceededException",
+  "BandwidthLimitExceeded",
+  "EC2ThrottledException",
+  "PriorRequestNotComplete",
+  "SlowDown",
+}
+
+# Latency percentiles reported by summary()
+PERCENTILES = [50, 90, 99]
+
+# Counters kept per (service, operation), latencies are kept separately
+COUNTERS = ["calls", "errors", "attempts", "throttles", "bytes"]
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class CallRecorder:
+  """
+  Records the calls made by instrumented clients, per (service, operation).
+  """
+
+  def __init__(self):
+    # (service, operation) -> {counter: value, "latencies": [seconds]}
+    self.operations = {}
+    self._lock = threading.Lock()
+
+  def instrument(self, client, session=None):
+    """
+    Registers the recorder's handlers on a client's events.
+    """
+    client.meta.events.register('before-call', self.on_before_call)
+    client.meta.events.register('after-call', self.on_after_call)
+    client.meta.events.register('after-call-error', self.on_after_call_error)
+    client.meta.events.register('needs-retry', self.on_needs_retry)
+
+  def _operation(self, key):
+    if key not in self.operations:
+      self.operations[key] = dict({counter: 0 for counter in COUNTERS}, latencies=[])
+    return self.operations[key]
+
+  def _finish_call(self, context, error):
+    start = context.pop('stats_start', None)
+    key = context.pop('stats_key', None)
+    if key is None:
+      return
+
+    with self._lock:
+      operation = self._operation(key)
+      operation["calls"] += 1
+      operation["errors"] += error
+      operation["latencies"].append(time.perf_counter() - start)
+
+  #---[Handlers]---
+
+  def on_before_call(self, model, context, **kwargs):
+    context['stats_key'] = (model.service_model.service_name, model.name)
+    context['stats_start'] = time.perf_counter()
+
+  def on_after_call(self, http_response, context, **kwargs):
+    self._finish_call(context, http_response.status_code >= 300)
+
+  def on_after_call_error(self, context, **kwargs):
+    self._finish_call(context, True)
+
+  def on_needs_retry(self, operation, response=None, **kwargs):
+    throttled = False
+    received = 0
+    if response is not None:
+      http_response, parsed = response
+      received = len(http_response.content or b"")
+      throttled = is_throttle(http_response, parsed)
+
+    with self._lock:
+      counters = self._operation((operation.service_model.service_name, operation.name))
+      counters["attempts"] += 1
+      counters["throttles"] += throttled
+      counters["bytes"] += received
+
+  #---[Snapshots]---
+
+  def snapshot(self, clear=False):
+    """
+    Returns a copy of the recorded calls (picklable), optionally clearing them.
+    """
+    with self._lock:
+      operations = {key: dict(counters, latencies=list(counters["latencies"]))
+                    for key, counters in self.operations.items()}
+      if clear:
+        self.operations = {}
+    return operations
+
+  def merge(self, operations):
+    """
+    Adds the calls of a snapshot (Example: from a fleet worker process).
+    """
+    with self._lock:
+      for key, counters in operations.items():
+        merged = self._operation(key)
+        for counter in COUNTERS:
+          merged[counter] += counters[counter]
+        merged["latencies"].extend(counters["latencies"])
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# The recorder of this process, set by enable()
+recorder = None
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: is_throttle
+def is_throttle(http_response, parsed):
+  """
+  Function: is_throttle
+  Description: Tell whether a response is AWS throttling the caller
+  Parameters: botocore AWSResponse
+              Parsed response dictionary
+  Returns: Boolean
+  """
+  return http_response.status_code == 429 or parsed.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+# ###################################################################################
+# Function: enable
+def enable():
+  """
+  Function: enable
+  Description: Start recording the calls of every client created from now on
+  Parameters: None
+  Returns: CallRecorder
+  """
+  global recorder
+  if recorder is None:
+    recorder = CallRecorder()
+    clients.add_hook(recorder.instrument)
+  return recorder
+
+
+# ###################################################################################
+# Function: take
+def take():
+  """
+  Function: take
+  Description: Return the calls recorded in this process so far and clear them,
+               fleet work items use it to hand their calls back to the caller
+  Parameters: None
+  Returns: Snapshot dictionary, None when recording is not enabled
+  """
+  if recorder is None:
+    return None
+  return recorder.snapshot(clear=True)
+
+
+# ###################################################################################
+# Function: percentile
+def percentile(values, percent):
+  """
+  Function: percentile
+  Description: Nearest-rank percentile
+  Parameters: Sorted list of values
+              Percentile (0-100)
+  Returns: Value, 0 for an empty list
+  """
+  if not values:
+    return 0
+  rank = max(1, -(-len(values) * percent // 100))
+  return values[int(rank) - 1]
+
+
+# ###################################################################################
+# Function: summary
+def summary(operations=None):
+  """
+  Function: summary
+  Description: Summarize the recorded calls, ready to be printed or dumped as JSON
+  Parameters: Snapshot dictionary, defaults to this process's recorder
+  Returns: Dictionary with an entry per operation (slowest total time first) and the totals
+  """
+  if operations is None:
+    operations = recorder.snapshot() if recorder else {}
+
+  entries = []
+  for (service, operation), counters in operations.items():
+    latencies = sorted(counters["latencies"])
+    entry = {"service": service, "operation": operation}
+    entry.update({counter: counters[counter] for counter in COUNTERS})
+    entry["retries"] = max(0, counters["attempts"] - counters["calls"])
+    entry["total_time"] = sum(latencies)
+    entry["latency"] = {f"p{percent}": percentile(latencies, percent) for percent in PERCENTILES}
+    entry["latency"]["max"] = latencies[-1] if latencies else 0
+    entries.append(entry)
+  entries.sort(key=lambda entry: entry["total_time"], reverse=True)
+
+  totals = {counter: sum(entry[counter] for entry in entries) for counter in COUNTERS + ["retries", "total_time"]}
+  return {"operations": entries, "totals": totals}
+
+
+# ###################################################################################
+# Function: summary_lines
+def summary_lines(stats_summary):
+  """
+  Function: summary_lines
+  Description: Format a summary as a table, one line per operation
+  Parameters: Dictionary returned by summary()
+  Returns: List of strings
+  """
+  lines = [f"{'operation':<44}{'calls':>7}{'errors':>8}{'retries':>9}{'throttles':>11}"
+           f"{'p50':>9}{'p90':>9}{'p99':>9}{'KB':>10}"]
+  for entry in stats_summary["operations"]:
+    latency = entry["latency"]
+    lines.append(f"{entry['service'] + ':' + entry['operation']:<44}{entry['calls']:>7}{entry['errors']:>8}"
+                 f"{entry['retries']:>9}{entry['throttles']:>11}{latency['p50']:>8.3f}s{latency['p90']:>8.3f}s"
+                 f"{latency['p99']:>8.3f}s{entry['bytes'] / 1024:>10.1f}")
+
+  totals = stats_summary["totals"]
+  lines.append(f"{'total':<44}{totals['calls']:>7}{totals['errors']:>8}{totals['retries']:>9}{totals['throttles']:>11}"
+               f"{'':>27}{totals['bytes'] / 1024:>10.1f}")
+  return lines
@@ -0,0 +1,219 @@
+# ###################################################################################
+# Script/module: modules\watch.py
+# Description: Watch mode, re-polls the collectors and reports only what changed.
+# Python Version: 3.8.x
+#
+# A RegionWatcher keeps one session (and so one set of warm clients and
+# connection pools, see modules\clients.py) per region for the life of the
+# process. After a first full scan, every collector is re-polled on its own
+# schedule: a multiple of the watch interval, so fast-moving resources (EC2
+# instances, ENIs) are polled every interval and slow-moving ones (EKS, IGWs)
+# only every few. Each poll is compared with the previous one and only the
+# resources that were added or removed are reported.
+#
+# Polls always go to AWS, the inventory cache is not used in watch mode.
+#
+# ###################################################################################
+
+# -----------------------------------------------------------------------------------
+# Example Usages:
+#
+# from modules import watch
+#
+# watchers = [watch.RegionWatcher("us-west-2", ["vpc-0123456789abcdef0"], False, workers=16, interval=60)]
+# for watcher, region_task in watch.first_polls(watchers):
+#   print(region_task.result)
+# for region, changes, errors in watch.watch(watchers):
+#   for change in changes:
+#     print(change.title, change.vpc, change.added, change.removed)
+#
+# -----------------------------------------------------------------------------------
+
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import time
+from argparse import ArgumentTypeError
+from collections import namedtuple
+
+# Custom Modules:
+from modules import clients
+from modules import collectors
+from modules import engine
+
+#---------------------------------------------------------[Declarations]------------------------------------------------------
+
+# Resources added to / removed from one section of one VPC since the previous poll.
+# title is the section title of a ResourceSpec, or VPCS_TITLE when a VPC itself came or went.
+Change = namedtuple("Change", ["region", "vpc", "title", "added", "removed"])
+
+VPCS_TITLE = "VPCs"
+
+# Collector (ResourceSpec name) -> poll every this many watch intervals (the others every interval)
+POLL_MULTIPLES = {
+  "describe_ekss": 10,
+  "describe_igws": 10,
+  "describe_vpgws": 10,
+  "describe_rdss": 5,
+  "describe_elbs": 5,
+  "describe_elbsV2": 5,
+  "describe_nats": 5,
+  "describe_vpc_epts": 5,
+  "describe_rtbs": 5,
+  "describe_acls": 5,
+  "describe_subnets": 5,
+  "describe_sgs": 2,
+  "describe_asgs": 2,
+  "describe_lambdas": 2,
+}
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class RegionWatcher:
+  """
+  Polls the collectors of one region on their schedules and diffs each poll with the previous one.
+  """
+
+  def __init__(self, region, requested_vpc_ids, all_vpcs, workers, interval=60, session=None, specs=None):
+    self.region = region
+    self.requested_vpc_ids = list(requested_vpc_ids)
+    self.all_vpcs = all_vpcs
+    self.workers = workers
+    self.interval = interval
+    self.session = session or clients.new_session(region_name=region)
+    self.specs = collectors.SPECS if specs is None else specs
+
+    # The VPCs described and, per section title, {VPC ID: set of resource IDs} as of the last poll
+    self.vpc_ids = []
+    self.state = {}
+
+    # Section title -> time.monotonic() the collector is next due
+    self.next_due = {}
+
+  def schedule(self, spec, now):
+    self.next_due[spec.title] = now + self.interval * POLL_MULTIPLES.get(spec.name, 1)
+
+  def first_poll(self):
+    """
+    Runs the full scan that later polls are compared with.
+    Returns a RegionResult, as collectors.scan_region().
+    """
+    region_result = collectors.scan_region(self.region, self.requested_vpc_ids, self.all_vpcs, self.workers,
+                                           session=self.session, specs=self.specs)
+    now = time.monotonic()
+    self.vpc_ids = region_result.vpc_ids
+
+    for spec, result in zip(region_result.specs, region_result.results):
+      if result.error is None:
+        self.state[spec.title] = {vpc: set(resources) for vpc, resources in result.result.items()}
+      self.schedule(spec, now)
+    return region_result
+
+  def due(self, now):
+    return min(self.next_due.values(), default=now) <= now
+
+  def poll(self):
+    """
+    Re-polls the VPC list and every collector that is due.
+    Returns (list of Change, list of TaskResult for the collectors that failed).
+    """
+    ctx = collectors.RegionContext(self.region, all_vpcs=self.all_vpcs, session=self.session)
+    region_vpc_ids = collectors.list_vpcs(ctx, None if self.all_vpcs else self.requested_vpc_ids)
+    if self.all_vpcs:
+      ctx.vpc_ids = region_vpc_ids
+    else:
+      ctx.vpc_ids = [vpc for vpc in self.requested_vpc_ids if vpc in region_vpc_ids]
+
+    changes = [Change(self.region, vpc, VPCS_TITLE, [vpc], []) for vpc in ctx.vpc_ids if vpc not in self.vpc_ids]
+    changes.extend(Change(self.region, vpc, VPCS_TITLE, [], [vpc]) for vpc in self.vpc_ids if vpc not in ctx.vpc_ids)
+
+    # A VPC that just appeared has no previous state, poll everything for it
+    if changes:
+      self.next_due = dict.fromkeys(self.next_due, 0)
+    self.vpc_ids = ctx.vpc_ids
+
+    now = time.monotonic()
+    due = [spec for spec in self.specs if self.next_due.get(spec.title, 0) <= now]
+    results = collectors.run_specs(ctx, due, self.workers)[0] if ctx.vpc_ids else []
+
+    errors = []
+    now = time.monotonic()
+    for spec in due:
+      self.schedule(spec, now)
+
+    for spec, result in zip(due, results):
+      if result.error is not None:
+        errors.append(result)
+        continue
+
+      current = {vpc: set(resources) for vpc, resources in result.result.items()}
+      previous = self.state.get(spec.title, {})
+      for vpc in ctx.vpc_ids:
+        added = sorted(current[vpc] - previous.get(vpc, set()))
+        removed = sorted(previous.get(vpc, set()) - current[vpc])
+        if added or removed:
+          changes.append(Change(self.region, vpc, spec.title, added, removed))
+      self.state[spec.title] = current
+
+    return changes, errors
+
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
+
+# ###################################################################################
+# Function: first_polls
+def first_polls(watchers):
+  """
+  Function: first_polls
+  Description: Run the first full scan of every watcher, one thread per region
+  Parameters: List of RegionWatcher
+  Returns: List of (RegionWatcher, TaskResult holding a RegionResult) in the order given
+  """
+  return list(zip(watchers, engine.run_concurrently([(watcher.region, watcher.first_poll) for watcher in watchers],
+                                                    len(watchers))))
+
+
+# ###################################################################################
+# Function: watch
+def watch(watchers, polls=None):
+  """
+  Function: watch
+  Description: Poll the watchers as their collectors come due, forever (or polls times)
+  Parameters: List of RegionWatcher, after first_polls()
+              Number of polls to run, None for no limit
+  Returns: Generator of (region, list of Change, list of TaskResult) per region polled
+  """
+  count = 0
+  while polls is None or count < polls:
+    now = time.monotonic()
+    next_due = min(min(watcher.next_due.values(), default=now + watcher.interval) for watcher in watchers)
+    if next_due > now:
+      time.sleep(next_due - now)
+
+    now = time.monotonic()
+    due = [watcher for watcher in watchers if watcher.due(now)]
+    for watcher, task in zip(due, engine.run_concurrently([(watcher.region, watcher.poll) for watcher in due], len(due))):
+      if task.error is not None:
+        yield watcher.region, [], [task]
+      else:
+        yield (watcher.region,) + task.result
+    count += 1
+
+
+# ###################################################################################
+# Function: parse_interval
+def parse_interval(value):
+  """
+  Function: parse_interval
+  Description: Parse a --watch value (the argparse type of --watch)
+  Parameters: --watch value
+  Returns: Watch interval in seconds
+           Raises ArgumentTypeError unless the interval is a positive number of seconds
+  """
+  try:
+    interval = float(value)
+  except ValueError:
+    raise ArgumentTypeError(f"invalid interval {value!r}, expected a number of seconds")
+  # A zero or negative interval would poll AWS in a tight loop
+  if not 0 < interval < float('inf'):
+    raise ArgumentTypeError(f"invalid interval {value!r}, the interval must be a positive number of seconds")
+  return interval
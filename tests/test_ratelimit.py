@@ -0,0 +1,108 @@
+# ###################################################################################
+# Script/module: tests\test_ratelimit.py
+# Description: Unit tests for the TokenBucket of modules\ratelimit.py.
+# Python Version: 3.8.x
+#
+# The bucket's clock (time.monotonic) and sleep are replaced by a fake clock,
+# so the tests never wait and never depend on the machine's speed.
+#
+# Usage: python -m unittest discover -s tests -t .
+#
+# ###################################################################################
+
+#---------------------------------------------------------[Imports]------------------------------------------------------
+
+import unittest
+from unittest import mock
+
+# Custom Modules:
+from modules import ratelimit
+
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
+
+class FakeClock:
+  """
+  time.monotonic() and time.sleep() stand-ins, sleeping moves the clock forward.
+  """
+
+  def __init__(self):
+    self.now = 1000.0
+    self.slept = 0
+
+  def monotonic(self):
+    return self.now
+
+  def sleep(self, seconds):
+    assert seconds >= 0
+    self.now += seconds
+    self.slept += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = FakeClock()
+    patcher = mock.patch.multiple(ratelimit.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_burst_then_refill(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+      bucket.acquire()
+    self.assertEqual(self.clock.slept, 0)
+
+    # Empty: the next token is 1 / rate seconds away
+    bucket.acquire()
+    self.assertAlmostEqual(self.clock.slept, 0.1)
+
+  def test_refill_never_exceeds_capacity(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=5)
+    bucket.acquire()
+    self.clock.now += 60
+    bucket._refill()
+    self.assertEqual(bucket.tokens, 5)
+
+  def test_rate_below_one_never_blocks_forever(self):
+    # The default burst is twice the rate, 0.5 tokens here
+    limiter = ratelimit.RateLimiter(ratelimit.parse_rates([ratelimit.parse_rate("lambda=0.25")]))
+    bucket = limiter.bucket("lambda", "eu-west-1")
+    self.assertEqual(bucket.capacity, 1)
+    bucket.acquire()
+    bucket.acquire()
+    self.assertAlmostEqual(self.clock.slept, 4)
+
+  def test_throttle_halves_rate_and_drops_tokens(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=5)
+    bucket.throttled()
+    self.assertEqual(bucket.rate, 10 * ratelimit.THROTTLE_FACTOR)
+    self.assertLessEqual(bucket.tokens, 0)
+
+    bucket.acquire()
+    self.assertAlmostEqual(self.clock.slept, 1 / bucket.rate)
+
+  def test_throttle_floor(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=5)
+    for _ in range(20):
+      bucket.throttled()
+    self.assertEqual(bucket.rate, ratelimit.MIN_RATE)
+
+  def test_throttle_never_raises_a_rate_under_the_floor(self):
+    bucket = ratelimit.TokenBucket(rate=0.1, burst=1)
+    bucket.throttled()
+    self.assertLessEqual(bucket.rate, bucket.max_rate)
+    self.assertEqual(bucket.rate, 0.1)
+
+  def test_recover_up_to_configured_rate(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=5)
+    bucket.throttled()
+    bucket.succeeded()
+    self.assertAlmostEqual(bucket.rate, 5 + 10 * ratelimit.RECOVERY_STEP)
+
+    for _ in range(100):
+      bucket.succeeded()
+    self.assertEqual(bucket.rate, 10)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -16,19 +16,62 @@
 # Requires requests:
 # Install with: sudo pip install requests
 #
+# The scanning itself is the VpcInventory library API (see modules\inventory.py),
+# this script parses the command line and renders the results.
+#
 # EXIT STATUS:
 #     Exit codes:
 #     0 = Success
 #     1 = Error
 #
-# Usage: vpc-inside.py [-h] -v VPC [-r REGION] [-p PROFILE] [-c yes/no]
+# Usage: vpc-inside.py [-h] (-v VPC [VPC ...] | --all-vpcs | --serve [HOST:]PORT)
+#                      [-r REGION] [--regions all|r1,r2,...]
+#                      [--role-arns ARN[,ARN...]] [--role-arns-file FILE] [--fleet-workers N]
+#                      [-p PROFILE] [-c yes/no] [-w WORKERS] [-q] [--progressive] [-o console|json|ndjson|csv]
+#                      [--config FILE] [client options]
+#                      [--cache-file FILE] [--cache-ttl [SERVICE=]SECONDS] [--no-cache] [--refresh SERVICE]
+#                      [--discovery collectors|enis|cross-check] [--stats] [--stats-json FILE]
+#                      [--rate-limit [SERVICE=]RATE] [--no-rate-limit] [--watch SECONDS]
+#                      [--only TYPE[,TYPE...]] [--skip TYPE[,TYPE...]] [--serve-ttl SECONDS]
 #
 # optional arguments:
 #  -h, --help                     show this help message and exit
-#  -v VPC, --vpc VPC              The VPC to annihilate
+#  -v VPC, --vpc VPC [VPC ...]    The VPC(s) to describe (space or comma separated)
+#  --all-vpcs                     Describe every VPC in the region
 #  -r REGION, --region REGION     AWS region that the VPC resides in
+#  --regions all|r1,r2,...        Scan several regions in parallel (overrides --region)
+#  --role-arns ARN[,ARN...]       Fleet mode: assume each role and scan its account
+#  --role-arns-file FILE          Fleet mode: file with one role ARN per line
+#  --fleet-workers N              Fleet mode: number of (account, region) worker processes
+#  --role-session-name NAME       Fleet mode: AssumeRole session name
 #  -p PROFILE, --profile PROFILE  AWS profile
 #  -c yes/no, --colorize yes/no   Add Colorization to output
+#  -w WORKERS, --workers WORKERS  Number of collectors to run concurrently
+#  -q, --summary                  Print the number of resources of each type per VPC instead of their IDs
+#  --progressive                  Print each section as soon as its collector finishes, then a summary per VPC
+#  -o FORMAT, --output FORMAT     Report format: console (default), json, ndjson or csv (records on stdout)
+#  --config FILE                  Client config file (default ~/.vpc-inside.cfg)
+#  --max-pool-connections N       HTTP connections pooled per client (default: workers)
+#  --retry-mode MODE              botocore retry mode: adaptive, standard or legacy
+#  --max-attempts N               Maximum attempts per call, including retries
+#  --connect-timeout SECONDS      Connection timeout
+#  --read-timeout SECONDS         Read timeout
+#  --tcp-keepalive yes/no         Enable TCP keepalive
+#  --cache-file FILE              Inventory cache file (default ~/.vpc-inside-cache.sqlite)
+#  --cache-ttl [SERVICE=]SECONDS  Cache TTL for every service, or for one service (repeatable)
+#  --no-cache                     Do not read or write the inventory cache
+#  --refresh SERVICE              Re-fetch a service (or service:operation, or all) (repeatable)
+#  --discovery MODE               Find resources per service (collectors), from the VPC's ENIs (enis)
+#                                 or both and report the differences (cross-check)
+#  --stats                        Print the API calls made per service and operation at the end
+#  --stats-json FILE              Write the API call summary as JSON to FILE (- for stdout)
+#  --rate-limit [SERVICE=]RATE    Requests per second for every service, or for one service (repeatable)
+#  --no-rate-limit                Do not rate limit the API calls
+#  --watch SECONDS                Keep polling and print only the resources added or removed
+#  --only TYPE[,TYPE...]          Only describe these resource types, in this order (Example: ec2,eni,sg)
+#  --skip TYPE[,TYPE...]          Do not describe these resource types
+#  --serve [HOST:]PORT            Serve the inventory over HTTP at /vpc/{vpc id}[/{type}] (instead of -v / --all-vpcs)
+#  --serve-ttl SECONDS            Serve mode: seconds a result is served before it is refreshed (default 60)
 #
 # Update/Mutation Log:
 # Who                     | Date               | Update/Mutation
@@ -42,577 +85,876 @@
 
 #---------------------------------------------------------[Imports]------------------------------------------------------
 
-import boto3
+import json
 import logging
-from argparse import ArgumentParser, HelpFormatter
-from botocore.exceptions import ClientError, ProfileNotFound
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser, ArgumentTypeError, HelpFormatter
 
 # Custom Modules:
+from modules import cache
 from modules import colorprint as cp
+from modules import clientconfig
+from modules import clients
+from modules import collectors
+from modules import discovery
+from modules import fleet
+from modules import inventory
+from modules import output
+from modules import progress
+from modules import ratelimit
+from modules import stats
+from modules import watch
 
 #---------------------------------------------------------[Script Parameters]------------------------------------------------------
 
-# VPC ID (Required)
-# Region (Optional)
+# VPC ID(s) or --all-vpcs (Required)
+# Region or Regions (Optional)
+# Fleet Role ARNs (Optional)
 # AWS Profile (Optional)
+# Workers (Optional)
+# Client Config (Optional)
+# Inventory Cache (Optional)
+# Discovery Mode (Optional)
+# API Call Stats (Optional)
+# Rate Limits (Optional)
+# Watch Interval (Optional)
+# Serve Address (Optional)
+# Resource Types (Optional)
+# Output Format (Optional)
 
 #---------------------------------------------------------[Logging Initializations]--------------------------------------------------------
 
 # See: modules\colorprint.py used for printing
 
-# logger config
+# logger config (logging.basicConfig() is called from main())
 logger = logging.getLogger()
-logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 #--------------------------------------------------------[Parameter Initialisations]-------------------------------------------------------
 
-# Argument parser config
-formatter = lambda prog: HelpFormatter(prog, max_help_position=52)
-parser = ArgumentParser(formatter_class=formatter)
-
-parser.add_argument("-v", "--vpc", required=True, help="The VPC to describe")
-parser.add_argument("-r", "--region", default="us-west-2", help="AWS region that the VPC resides in")
-parser.add_argument("-p", '--profile', default='default', help="AWS profile")
-parser.add_argument("-c", '--colorize', default='no', help="Colorized Output")
-args = parser.parse_args()
+def build_parser():
+  """
+  Returns the argument parser for the command line.
+  """
 
+  # Argument parser config
+  formatter = lambda prog: HelpFormatter(prog, max_help_position=52)
+  parser = ArgumentParser(formatter_class=formatter)
+
+  vpc_group = parser.add_mutually_exclusive_group(required=True)
+  vpc_group.add_argument('--serve', metavar="[HOST:]PORT", help="Serve the inventory over HTTP at /vpc/{vpc id}[/{type}] instead of printing it")
+  vpc_group.add_argument("-v", "--vpc", nargs="+", help="The VPC(s) to describe")
+  vpc_group.add_argument('--all-vpcs', action='store_true', help="Describe every VPC in the region")
+  parser.add_argument("-r", "--region", default="us-west-2", help="AWS region that the VPC resides in")
+  parser.add_argument('--regions', help="Scan several regions in parallel: all or r1,r2,...")
+  parser.add_argument('--role-arns', help="Fleet mode: comma separated role ARNs to assume, one per account")
+  parser.add_argument('--role-arns-file', help="Fleet mode: file with one role ARN per line")
+  parser.add_argument('--fleet-workers', type=int, default=os.cpu_count(), help="Fleet mode: number of worker processes (0 = run in this process)")
+  parser.add_argument('--role-session-name', default=fleet.DEFAULT_SESSION_NAME, help="Fleet mode: AssumeRole session name")
+  parser.add_argument("-p", '--profile', default='default', help="AWS profile")
+  parser.add_argument("-c", '--colorize', default='no', help="Colorized Output")
+  parser.add_argument("-w", '--workers', type=int, default=16, help="Number of collectors to run concurrently")
+  parser.add_argument("-q", '--summary', action='store_true', help="Print the number of resources of each type per VPC instead of their IDs")
+  parser.add_argument('--progressive', action='store_true', help="Print each section as soon as its collector finishes, with a progress line, then a summary per VPC")
+  parser.add_argument("-o", '--output', choices=output.OUTPUT_FORMATS, default="console", help="Report format: console, or json, ndjson or csv records on stdout")
+
+  # Client config, unset options fall back to the config file then the defaults in modules\clientconfig.py
+  parser.add_argument('--config', help=f"Client config file (default {clientconfig.DEFAULT_CONFIG_FILE})")
+  parser.add_argument('--max-pool-connections', type=int, help="HTTP connections pooled per client (default: workers)")
+  parser.add_argument('--retry-mode', choices=clientconfig.RETRY_MODES, help="botocore retry mode (default adaptive)")
+  parser.add_argument('--max-attempts', type=int, help="Maximum attempts per call, including retries")
+  parser.add_argument('--connect-timeout', type=float, help="Connection timeout in seconds")
+  parser.add_argument('--read-timeout', type=float, help="Read timeout in seconds")
+  parser.add_argument('--tcp-keepalive', choices=["yes", "no"], help="Enable TCP keepalive (default yes)")
+
+  # Inventory cache, see modules\cache.py for the default TTLs
+  parser.add_argument('--cache-file', help=f"Inventory cache file (default {cache.DEFAULT_CACHE_FILE})")
+  parser.add_argument('--cache-ttl', action='append', type=cache.parse_ttl, metavar="[SERVICE=]SECONDS", help="Cache TTL for every service, or for one service or service:operation (repeatable)")
+  parser.add_argument('--no-cache', action='store_true', help="Do not read or write the inventory cache")
+  parser.add_argument('--refresh', action='append', metavar="SERVICE", help="Re-fetch a service, service:operation or all instead of using the cache (repeatable)")
+
+  # Discovery mode, see modules\discovery.py
+  parser.add_argument('--discovery', choices=collectors.DISCOVERY_MODES, default="collectors", help="Find resources per service (collectors), from the VPC's ENIs (enis) or both and compare (cross-check)")
+
+  # API call instrumentation, see modules\stats.py
+  parser.add_argument('--stats', action='store_true', help="Print the API calls made per service and operation at the end")
+  parser.add_argument('--stats-json', metavar="FILE", help="Write the API call summary as JSON to FILE (- for stdout)")
+
+  # Client-side rate limiting per account, service and region, see modules\ratelimit.py for the default rates
+  parser.add_argument('--rate-limit', action='append', type=ratelimit.parse_rate, metavar="[SERVICE=]RATE", help="Requests per second for every service, or for one service (repeatable)")
+  parser.add_argument('--no-rate-limit', action='store_true', help="Do not rate limit the API calls")
+
+  # Watch mode, see modules\watch.py for how often each collector is re-polled
+  parser.add_argument('--watch', type=watch.parse_interval, metavar="SECONDS", help="Keep polling every SECONDS and print only the resources added or removed")
+
+  # Serve mode, see modules\server.py
+  parser.add_argument('--serve-ttl', type=float, metavar="SECONDS", help="Serve mode: seconds a result is served before it is refreshed (default 60)")
+
+  # Resource types, see SPECS in modules\collectors.py
+  resource_types = ",".join(spec.key for spec in collectors.SPECS)
+  parser.add_argument('--only', metavar="TYPE[,TYPE...]", help=f"Only describe these resource types, in this order: {resource_types}")
+  parser.add_argument('--skip', metavar="TYPE[,TYPE...]", help="Do not describe these resource types")
+  return parser
+
+
+def init_client_config():
+  """
+  Sets the botocore Config shared by every client from the command line and config file.
+  """
 
-if args.colorize == "yes":
-  cp.print_fg_bright_green(f"Arguments Passed: {args}")
-else:
-  logger.info(f"Arguments Passed: {args}")
+  overrides = {
+    "max_pool_connections": args.max_pool_connections,
+    "retry_mode": args.retry_mode,
+    "max_attempts": args.max_attempts,
+    "connect_timeout": args.connect_timeout,
+    "read_timeout": args.read_timeout,
+    "tcp_keepalive": None if args.tcp_keepalive is None else args.tcp_keepalive == "yes",
+  }
+  settings = clientconfig.client_settings(overrides, args.config, args.workers)
+  clients.configure(clientconfig.build_config(settings))
 
 #---------------------------------------------------------[Boto3 Initializations]--------------------------------------------------------
 
-# boto client config
-try:
-    # session = boto3.Session(profile_name=args.profile) # Gives Error: You are not authorized to perform this operation.
-    session = boto3.Session(region_name=args.region) # This Works!
-except ProfileNotFound as e:
-  if args.colorize == "yes":
-    cp.print_fg_bright_red(f"{e}, please provide a valid AWS profile name")
-  else:
-    logger.warning(f"{e}, please provide a valid AWS profile name")
-    exit(-1)
-
-vpc_client = session.client("ec2", region_name=args.region)
-elbV2_client = session.client('elbv2', region_name=args.region)
-elb_client = session.client('elb', region_name=args.region)
-lambda_client = session.client('lambda', region_name=args.region)
-eks_client = session.client('eks', region_name=args.region)
-asg_client = session.client('autoscaling', region_name=args.region)
-rds_client = session.client('rds', region_name=args.region)
-ec2 = session.resource('ec2', region_name=args.region)
+def init_renderer():
+  """
+  Returns the renderer of --output. Records go to stdout, so with a record format
+  everything else is logged uncolored (to stderr).
+  """
 
-vpc_id: str = args.vpc
+  # Serve mode answers over HTTP, no writer is opened so nothing is written to stdout
+  if args.output == "console" or args.serve:
+    return ProgressiveRenderer() if args.progressive else ConsoleRenderer()
+  args.colorize = "no"
+  return RecordRenderer(output.open_writer(args.output, sys.stdout))
 
-#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
 
-# None
-  
-#----------------------------------------------------------[Declarations]----------------------------------------------------------
+def init_cache():
+  """
+  Returns the inventory cache, or None with --no-cache.
+  """
 
-# None
+  if args.no_cache:
+    return None
+  return cache.InventoryCache(args.cache_file, cache.parse_ttls(args.cache_ttl), args.refresh)
 
-#-----------------------------------------------------------[Functions]------------------------------------------------------------
 
-def vpc_in_region():
+def init_session():
   """
-  Describes one or more of your VPCs.
+  Returns the boto3 session with the ambient credentials.
+  No clients are created here, they are created on first use (see modules\clients.py)
+  and each region gets its own session (see modules\collectors.py).
   """
 
-  vpc_exists = False
-  try:
-    vpcs = list(ec2.vpcs.filter(Filters=[]))
-  except ClientError as ce:
-    if args.colorize == "yes":
-      cp.print_fg_bright_red('vpc-inside - vpc_in_region(): The EC2 Client had an error. See the Error Code and Message for details.')
-      cp.print_fg_bright_red('vpc-inside - vpc_in_region(): ClientError: vpc_in_region().')
-      cp.print_fg_bright_red('Error Code: {0}'.format(ce.response['Error']['Code']))
-      cp.print_fg_bright_red('Error Message: {0}'.format(ce.response['Error']['Message']))
-    else:
-      logger.error('Error Code: {0}'.format(ce.response['Error']['Code']))
-      logger.error('Error Message: {0}'.format(ce.response['Error']['Message']))
-      exit()
-    
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"VPCs in region {args.region}:")
-  else:
-    logger.info(f"VPCs in region {args.region}:")
+  # boto3 is only imported once the command line has been parsed, see modules\clients.py
+  import boto3
+  from botocore.exceptions import ProfileNotFound
 
-  for vpc in vpcs:
+  # boto client config
+  try:
+      # session = boto3.Session(profile_name=args.profile) # Gives Error: You are not authorized to perform this operation.
+      return boto3.Session(region_name=args.region) # This Works!
+  except ProfileNotFound as e:
     if args.colorize == "yes":
-      cp.print_fg_bright_green(vpc.id)
+      cp.print_fg_bright_red(f"{e}, please provide a valid AWS profile name")
     else:
-      logger.info(vpc.id)
-
-    if vpc.id == vpc_id:
-      vpc_exists = True
-
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
-    
-  return vpc_exists
+      logger.warning(f"{e}, please provide a valid AWS profile name")
+    exit(-1)
 
+#---------------------------------------------------------[Class Initializations]--------------------------------------------------------
 
-def describe_asgs():
+class Section:
   """
-  Describes one or more of your Auto Scaling Groups.
+  Buffers the output lines of one section, so collectors can run
+  concurrently and still be printed in the original section order.
+  The section is printed in one go, see cp.SectionPrinter.
   """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"ASGs in VPC {vpc_id}:")
-  else:
-    logger.info(f"ASGs in VPC {vpc_id}:")
-    
-  asgs = asg_client.describe_auto_scaling_groups()['AutoScalingGroups']
-  for asg in asgs:
-    asg_name = asg['AutoScalingGroupName']
-    if asg_in_vpc(asg):
-      if args.colorize == "yes":
-        cp.print_fg_bright_green(asg_name)
-      else:
-        logger.info(asg_name)
+  def __init__(self, name):
+    self.name = name
+    self.lines = []
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
-    
-    return
+  def header(self, text):
+    self.lines.append((cp.COLOR_BRIGHT_BLUE, logging.INFO, text))
 
+  def item(self, text):
+    self.lines.append((cp.COLOR_BRIGHT_GREEN, logging.INFO, text))
 
-def asg_in_vpc(asg):
-  subnets_list = asg['VPCZoneIdentifier'].split(',')
-  for subnet in subnets_list:
-    try:
-      sub_description = vpc_client.describe_subnets(SubnetIds=[subnet])['Subnets']
-      if sub_description[0]['VpcId'] == vpc_id:
-        if args.colorize == "yes":
-          cp.print_fg_bright_green(f"{asg['AutoScalingGroupName']} resides in {vpc_id}")
-        else:
-          logger.info(f"{asg['AutoScalingGroupName']} resides in {vpc_id}")
-      return True
-    except ClientError:
-      pass
+  def error(self, text):
+    self.lines.append((cp.COLOR_BRIGHT_RED, logging.ERROR, text))
 
-  return False
+  def added(self, text):
+    self.lines.append((cp.COLOR_BRIGHT_GREEN, logging.INFO, text))
 
+  def removed(self, text):
+    self.lines.append((cp.COLOR_BRIGHT_RED, logging.INFO, text))
 
-def describe_ekss():
-  ekss = eks_client.list_clusters()['clusters']
+  def separator(self):
+    self.lines.append((cp.COLOR_BRIGHT_YELLOW, logging.INFO, "--------------------------------------------"))
 
-  if args.colorize == "yes":
-   cp.print_fg_bright_blue(f"EKSs in VPC {vpc_id}:")
-  else:
-    logger.info("EKSs in VPC {}:".format(vpc_id))
+  def emit(self):
+    printer.print(self.lines)
 
-  for eks in ekss:
-    eks_desc = eks_client.describe_cluster(name=eks)['cluster']
-    if eks_desc['resourcesVpcConfig']['vpcId'] == vpc_id:
-      if args.colorize == "yes":
-        cp.print_fg_bright_green(eks_desc['name'])
-      else:
-        logger.info(eks_desc['name'])
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+class ConsoleRenderer:
+  """
+  Renders the report as colorized (or logged) console sections, see modules\colorprint.py.
+  """
 
-  return
+  def region(self, region_result, account=None, tag_region=False):
+    """
+    Prints the report of one region: its VPCs, then every section of every VPC described.
+    """
+
+    tag = None
+    if account:
+      tag = f"{account} {region_result.region}"
+    elif tag_region:
+      tag = region_result.region
+
+    vpcs_section(region_result.region, region_result.region_vpc_ids, account).emit()
+
+    # A failed collector failed for every VPC, its error is printed once for the region
+    for result in region_result.results + [region_result.discovered]:
+      if result is None or result.error is None:
+        continue
+      if clients.aws_error(result.error) is None:
+        raise result.error
+      client_error(result.name, result.error).emit()
+
+    discovered = region_result.discovered
+    for vpc in region_result.vpc_ids:
+      # (label, count) per section with --summary
+      counts = []
+      collector_buckets = {}
+      for spec, result in zip(region_result.specs, region_result.results):
+        if result.error is None:
+          collector_buckets[spec.title] = result.result[vpc]
+          if args.summary:
+            counts.append((spec.title, len(result.result[vpc])))
+          else:
+            resource_section(spec.title, vpc, result.result[vpc], tag).emit()
+
+      if discovered is not None and discovered.error is None:
+        mismatches = None
+        if region_result.results:
+          mismatches = discovery.cross_check(discovered.result[vpc], collector_buckets,
+                                             collectors.gateway_endpoint_ids(region_result, vpc))
+        if args.summary:
+          counts.extend((f"{service} from ENIs", len(discovered.result[vpc][service]))
+                        for service in discovery.SERVICES if service in discovered.result[vpc])
+          if mismatches is not None:
+            counts.append(("Cross-check differences", len(mismatches)))
+        else:
+          for section in discovered_sections(vpc, discovered.result[vpc], tag):
+            section.emit()
+          if mismatches is not None:
+            cross_check_section(vpc, mismatches, tag).emit()
 
+      if args.summary:
+        summary_section(vpc, counts, tag).emit()
 
-def describe_ec2s():
-  waiter = vpc_client.get_waiter('instance_terminated')
-  reservations = vpc_client.describe_instances(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['Reservations']
+    if region_result.results or discovered:
+      collector_timings(region_result).emit()
 
-  # Get a list of ec2s
-  ec2s = [ec2['InstanceId'] for reservation in reservations for ec2 in reservation['Instances']]
+  def changes(self, region, changes, tag_region=False):
+    changes_section(region, changes, tag_region).emit()
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"EC2s in VPC {vpc_id}:")
-  else:
-    logger.info(f"EC2s in VPC {vpc_id}:")
- 
-  for ec2 in ec2s:
+  def error(self, name, error, account=None, region=None):
+    client_error(name, error).emit()
+
+  def not_found(self, vpc, regions):
     if args.colorize == "yes":
-      cp.print_fg_bright_green(ec2)
+      cp.print_blink(f"The given VPC {vpc} was not found in {', '.join(regions)}")
     else:
-      logger.info(ec2)
-
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
-  
-  return
+      logger.info(f"The given VPC {vpc} was not found in {', '.join(regions)}")
 
+  def close(self):
+    pass
 
-def describe_lambdas():
-  lmbds = lambda_client.list_functions()['Functions']
 
-  lambdas_list = [lmbd['FunctionName'] for lmbd in lmbds
-                  if 'VpcConfig' in lmbd and lmbd['VpcConfig']['VpcId'] == vpc_id]
+class ProgressiveRenderer(ConsoleRenderer, collectors.ScanListener):
+  """
+  Renders the console report as the scan goes (--progressive): the VPCs of a region as soon
+  as they are listed and each resource type as soon as its collector finishes, with a live
+  progress line of the collectors still running (see modules\progress.py). Once the region
+  is done, the sections that need every collector (ENI discovery, cross-check) and a summary
+  per VPC follow in the usual order.
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"Lambdas in VPC {vpc_id}:")
-  else:
-    logger.info(f"Lambdas in VPC {vpc_id}:")
+  def __init__(self):
+    self.progress_line = None
+    self.tag_region = False
+
+  def start(self, regions):
+    """
+    Starts the progress line, before the regions are scanned.
+    """
+
+    self.tag_region = len(regions) > 1
+    self.progress_line = progress.ProgressLine(printer)
+    self.progress_line.start()
+
+  def emit(self, sections):
+    self.progress_line.print([line for section in sections for line in section.lines])
+
+  def label(self, region, name):
+    return f"{name} ({region})" if self.tag_region else name
+
+  def vpcs(self, region, region_vpc_ids, vpc_ids):
+    self.emit([vpcs_section(region, region_vpc_ids)])
+
+  def task_started(self, region, name):
+    self.progress_line.add(self.label(region, name))
+
+  def task_finished(self, region, name):
+    self.progress_line.remove(self.label(region, name))
+
+  def spec_done(self, region, spec, result):
+    # Any other error is raised by region(), from the scanning thread it would only stop the scan
+    if clients.aws_error(result.error) is not None:
+      self.emit([client_error(result.name, result.error)])
+    elif result.error is None and not args.summary:
+      tag = region if self.tag_region else None
+      self.emit([resource_section(spec.title, vpc, resources, tag) for vpc, resources in result.result.items()])
+
+  def region(self, region_result, account=None, tag_region=False):
+    """
+    Prints what was not printed as the region was scanned: the ENI discovery, the
+    cross-check, a summary per VPC and the collector timings.
+    """
+
+    tag = region_result.region if tag_region else None
+    for result in [region_result.discovered] + region_result.results:
+      if result is not None and result.error is not None and clients.aws_error(result.error) is None:
+        raise result.error
+
+    discovered = region_result.discovered
+    if discovered is not None and discovered.error is not None:
+      self.emit([client_error(discovered.name, discovered.error)])
+      discovered = None
+
+    for vpc in region_result.vpc_ids:
+      collector_buckets = {spec.title: result.result[vpc]
+                           for spec, result in zip(region_result.specs, region_result.results) if result.error is None}
+      counts = list(collector_buckets.items())
+
+      sections = []
+      if discovered is not None:
+        if not args.summary:
+          sections.extend(discovered_sections(vpc, discovered.result[vpc], tag))
+        counts.extend((f"{service} from ENIs", discovered.result[vpc][service])
+                      for service in discovery.SERVICES if service in discovered.result[vpc])
+        if region_result.results:
+          mismatches = discovery.cross_check(discovered.result[vpc], collector_buckets,
+                                             collectors.gateway_endpoint_ids(region_result, vpc))
+          if not args.summary:
+            sections.append(cross_check_section(vpc, mismatches, tag))
+          counts.append(("Cross-check differences", mismatches))
+
+      sections.append(summary_section(vpc, [(label, len(resources)) for label, resources in counts], tag))
+      self.emit(sections)
+
+    if region_result.results or discovered:
+      self.emit([collector_timings(region_result)])
+
+  def error(self, name, error, account=None, region=None):
+    self.emit([client_error(name, error)])
+
+  def close(self):
+    if self.progress_line is not None:
+      self.progress_line.stop()
+
+
+class RecordRenderer(collectors.ScanListener):
+  """
+  Renders the report as records written to stdout as they are made, see modules\output.py.
+  As the listener of a scan it writes the VPCs as soon as they are listed and the records
+  of each resource type as soon as its collector finishes, region() then only adds the
+  ENI discovery. Errors and timings are logged (to stderr) as well, so stdout only carries the records.
+  """
 
-  for lmbda in lambdas_list:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(lmbda)
+  def __init__(self, writer):
+    self.writer = writer
+
+    # The listener methods are called from every region's scanning thread
+    self._lock = threading.Lock()
+
+    # Regions whose VPCs and resources were written as they were scanned
+    self.streamed = set()
+
+  def write(self, records):
+    with self._lock:
+      for record in records:
+        self.writer.write(record)
+      self.writer.flush()
+
+  def vpcs(self, region, region_vpc_ids, vpc_ids):
+    self.streamed.add(region)
+    self.write(output.vpc_records(region, region_vpc_ids))
+
+  def spec_done(self, region, spec, result):
+    # Any other error is raised by region(), from the scanning thread it would only stop the scan
+    if result.error is None:
+      self.write(output.resource_records(region, spec, result.result))
+    elif clients.aws_error(result.error) is not None:
+      self.error(result.name, result.error, region=region)
+
+  def region(self, region_result, account=None, tag_region=False):
+    failed = [result for result in [region_result.discovered] + region_result.results
+              if result is not None and result.error is not None]
+    for result in failed:
+      if clients.aws_error(result.error) is None:
+        raise result.error
+
+    if region_result.region in self.streamed:
+      self.write(record for vpc in region_result.vpc_ids
+                 for record in output.discovery_records(region_result, vpc, account))
+      failed = [result for result in failed if result is region_result.discovered]
     else:
-      logger.info(lmbda)
+      self.write(output.region_records(region_result, account))
+    for result in failed:
+      self.error(result.name, result.error, account, region_result.region)
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+    if region_result.results or region_result.discovered:
+      collector_timings(region_result).emit()
 
-  return
+  def changes(self, region, changes, tag_region=False):
+    self.write(output.change_records(changes))
 
+  def error(self, name, error, account=None, region=None):
+    self.write([output.error_record(name, error, account, region)])
+    client_error(name, error).emit()
 
-def describe_rdss():
-  rdss = rds_client.describe_db_instances()['DBInstances']
+  def not_found(self, vpc, regions):
+    self.write([output.not_found_record(vpc, regions)])
+    logger.info(f"The given VPC {vpc} was not found in {', '.join(regions)}")
 
-  rdsss_list = [rds['DBInstanceIdentifier'] for rds in rdss if rds['DBSubnetGroup']['VpcId'] == vpc_id]
+  def close(self):
+    self.writer.close()
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"RDSs in VPC {vpc_id}:")
-  else:
-    logger.info(f"RDSs in VPC {vpc_id}:")
+#----------------------------------------------------------[Declarations]----------------------------------------------------------
 
-  for rds in rdsss_list:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(rds)
-    else:
-      logger.info(rds)
+# Set by main(), importing this module has no side effects
+args = None
+session = None
+inventory_cache = None
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+# The requested VPC IDs, "-v a b" and "-v a,b" are both accepted
+requested_vpc_ids = []
 
-  return
+# Fleet mode role ARNs, one per account
+role_arns = []
 
+# The resource type keys to describe and to leave out, from --only / --skip
+kinds = []
+skip_kinds = []
 
-def describe_elbs():
-  elbs = elb_client.describe_load_balancers()['LoadBalancerDescriptions']
+# ConsoleRenderer or RecordRenderer, from --output
+renderer = None
 
-  elbs = [elb['LoadBalancerName'] for elb in elbs if elb['VPCId'] == vpc_id]
+# Prints the console sections, see cp.SectionPrinter
+printer = None
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"Classic ELBs in VPC {vpc_id}:")
-  else:
-    logger.info(f"Classic ELBs in VPC {vpc_id}:")
+#-----------------------------------------------------------[Functions]------------------------------------------------------------
 
-  for elb in elbs:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(elb)
-    else:
-      logger.info(elb)
+def get_regions():
+  """
+  Returns the regions to scan: --regions (all or a comma separated list) or --region.
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+  if not args.regions:
+    return [args.region]
 
-  return
+  if args.regions == "all":
+    if role_arns:
+      return collectors.list_regions(fleet.account_session(role_arns[0], args.region, args.role_session_name))
+    return collectors.list_regions(session)
 
+  return [region for region in args.regions.split(',') if region]
 
-def describe_elbsV2():
-  elbs = elbV2_client.describe_load_balancers()['LoadBalancers']
 
-  elbs_list = [elb['LoadBalancerArn'] for elb in elbs if elb['VpcId'] == vpc_id]
+def vpc_ids():
+  """
+  Returns the VPC IDs to describe, None for every VPC (--all-vpcs).
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"ELBs V2 in VPC {vpc_id}:")
-  else:
-    logger.info(f"ELBs V2 in VPC {vpc_id}:")
+  return None if args.all_vpcs else requested_vpc_ids
 
-  for elb in elbs_list:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(elb)
-    else:
-      logger.info(elb)
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+def region_inventories(regions):
+  """
+  Returns a VpcInventory per region. The script's session is reused for its own
+  region, the other regions get their own.
+  """
 
-  return
+  return [inventory.VpcInventory(session if region == args.region else None, region, args.workers, inventory_cache)
+          for region in regions]
 
 
-def describe_nats():
-  nats = vpc_client.describe_nat_gateways(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['NatGateways']
+def fleet_region_tasks(regions):
+  """
+  Scans the fleet and yields (account, TaskResult) as each work item finishes.
+  The API calls made by the work items are added to this process's stats.
+  """
 
-  nats = [nat['NatGatewayId'] for nat in nats]
-  
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"NAT GWs in VPC {vpc_id}:")
-  else:
-    logger.info(f"NAT GWs in VPC {vpc_id}:")
+  for fleet_result in fleet.scan_fleet(role_arns, regions, requested_vpc_ids, args.all_vpcs,
+                                       args.workers, args.fleet_workers, args.role_session_name,
+                                       inventory_cache, args.discovery, collectors.select_specs(kinds, skip_kinds)):
+    if fleet_result.stats:
+      stats.recorder.merge(fleet_result.stats)
+    yield fleet_result.account, fleet_result.task
 
-  for nat in nats:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(nat)
-    else:
-      logger.info(nat)
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
+def vpcs_section(region, region_vpc_ids, account=None):
+  """
+  Builds the output section listing the VPCs of a region.
+  """
+
+  section = Section(region)
+  if account:
+    section.header(f"VPCs in account {account} region {region}:")
   else:
-    logger.info("--------------------------------------------")
-  
-  return
+    section.header(f"VPCs in region {region}:")
 
+  for vpc in region_vpc_ids:
+    section.item(vpc)
 
-def describe_enis():
-  enis = vpc_client.describe_network_interfaces(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['NetworkInterfaces']
+  section.separator()
+  return section
 
-  # Get a list of enis
-  enis = [eni['NetworkInterfaceId'] for eni in enis]
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"ENIs in VPC {vpc_id}:")
-  else:
-    logger.info(f"ENIs in VPC {vpc_id}:")
-  
-  for eni in enis:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(eni)
-    else:
-      logger.info(eni)
+def resource_section(title, vpc, resources, tag=None):
+  """
+  Builds the output section listing the resources of one type in one VPC.
+  The header is tagged with the region (and account) when several are scanned.
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
+  section = Section(title)
+  if tag:
+    section.header(f"{title} in VPC {vpc} ({tag}):")
   else:
-    logger.info("--------------------------------------------")
+    section.header(f"{title} in VPC {vpc}:")
+
+  for resource in resources:
+    section.item(resource)
 
-  return
+  section.separator()
+  return section
 
 
-def describe_igws():
+def summary_section(vpc, counts, tag=None):
   """
-  Describe the internet gateway
+  Builds the output section with the number of resources of each type in one VPC, for --summary.
   """
 
-  # Get list of dicts
-  igws = vpc_client.describe_internet_gateways(
-        Filters=[{"Name": "attachment.vpc-id",
-                  "Values": [vpc_id]}])['InternetGateways']
+  section = Section("Summary")
+  if tag:
+    section.header(f"Resources in VPC {vpc} ({tag}):")
+  else:
+    section.header(f"Resources in VPC {vpc}:")
 
-  igws = [igw['InternetGatewayId'] for igw in igws]
+  for label, count in counts:
+    section.item(f"{label}: {count}")
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"IGWs in VPC {vpc_id}:")
-  else:
-    logger.info(f"IGWs in VPC {vpc_id}:")
+  section.separator()
+  return section
 
-  for igw in igws:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(igw)
+
+def discovered_sections(vpc, discovered, tag=None):
+  """
+  Builds the output sections listing the resources found from the ENIs of one VPC, one per service.
+  """
+
+  sections = []
+  for service in discovery.SERVICES:
+    if service not in discovered:
+      continue
+
+    section = Section(service)
+    if tag:
+      section.header(f"{service} in VPC {vpc} from ENIs ({tag}):")
     else:
-      logger.info(igw)
+      section.header(f"{service} in VPC {vpc} from ENIs:")
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
+    for resource, eni_ids in discovered[service].items():
+      section.item(f"{resource} ({len(eni_ids)} ENIs)")
+
+    section.separator()
+    sections.append(section)
+  return sections
+
+
+def cross_check_section(vpc, mismatches, tag=None):
+  """
+  Builds the output section listing where the ENI discovery and the collectors disagree for one VPC.
+  """
+
+  section = Section("Cross-check")
+  if tag:
+    section.header(f"ENI discovery vs collectors in VPC {vpc} ({tag}):")
   else:
-    logger.info("--------------------------------------------")
-  
-  return
+    section.header(f"ENI discovery vs collectors in VPC {vpc}:")
+
+  for service, resource, found_by in mismatches:
+    section.item(f"{service} {resource}: {found_by}")
+  if not mismatches:
+    section.item("No differences")
+
+  section.separator()
+  return section
 
 
-def describe_vpgws():
+def client_error(name, error):
   """
-  Describe the virtual private gateway
+  Builds the output section for a collector or region that raised an AWS error (see clients.aws_error()).
   """
 
-  # Get list of dicts
-  vpgws = vpc_client.describe_vpn_gateways(
-        Filters=[{"Name": "attachment.vpc-id",
-                  "Values": [vpc_id]}])['VpnGateways']
+  code, message = clients.aws_error(error)
+  section = Section(name)
+  section.error(f"vpc-inside - {name}(): The AWS Client had an error. See the Error Code and Message for details.")
+  section.error('Error Code: {0}'.format(code))
+  section.error('Error Message: {0}'.format(message))
+  section.separator()
+  return section
 
-  vpgws = [vpgw['VpnGatewayId'] for vpgw in vpgws]
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"VPGWs in VPC {vpc_id}:")
+def changes_section(region, changes, tag_region=False):
+  """
+  Builds the output section listing the resources added (+) and removed (-) in a region since the last poll.
+  """
+
+  section = Section("Changes")
+  if tag_region:
+    section.header(f"Changes at {time.strftime('%H:%M:%S')} ({region}):")
   else:
-    logger.info(f"VPGWs in VPC {vpc_id}:")
+    section.header(f"Changes at {time.strftime('%H:%M:%S')}:")
 
-  for vpgw in vpgws:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(vpgw)
-    else:
-      logger.info(vpgw)
+  for change in changes:
+    for resource in change.added:
+      section.added(f"+ {change.title} in VPC {change.vpc}: {resource}")
+    for resource in change.removed:
+      section.removed(f"- {change.title} in VPC {change.vpc}: {resource}")
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+  section.separator()
+  return section
 
-  return
 
+def collector_timings(region_result):
+  """
+  Builds the output section reporting how long each collector took in a region.
+  """
 
-def describe_subnets():
-  # Get list of dicts of metadata
-  subnets = vpc_client.describe_subnets(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['Subnets']
+  section = Section("Timings")
+  section.header(f"Collector timings in region {region_result.region}:")
 
-  # Get a list of subnets
-  subnets = [subnet['SubnetId'] for subnet in subnets]
+  results = region_result.results
+  if region_result.discovered:
+    results = [region_result.discovered] + results
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"Subnets in VPC {vpc_id}:")
-  else:
-    logger.info(f"Subnets in VPC {vpc_id}:")
+  for result in results:
+    section.item(f"{result.name}: {result.elapsed:.2f}s")
 
-  for subnet in subnets:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(subnet)
-    else:
-      logger.info(subnet)
+  section.header(f"Region wall time: {region_result.wall_time:.2f}s ({args.workers} workers, {len(region_result.vpc_ids)} VPCs)")
+  section.separator()
+  return section
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
 
-  return
+def stats_section(stats_summary):
+  """
+  Builds the output section with the API calls made per service and operation.
+  """
 
+  section = Section("Stats")
+  section.header("API calls per service and operation:")
+  for line in stats.summary_lines(stats_summary):
+    section.item(line)
+  section.separator()
+  return section
 
-def describe_acls():
-  acls = vpc_client.describe_network_acls(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['NetworkAcls']
 
-  # Get a list of Network ACL's
-  acls = [acl['NetworkAclId'] for acl in acls]
+def write_stats_json(stats_summary, path):
+  """
+  Writes the API call summary as JSON, to stdout when path is -.
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"ACLs in VPC {vpc_id}:")
-  else:
-    logger.info(f"ACLs in VPC {vpc_id}:")
+  if path == "-":
+    print(json.dumps(stats_summary, indent=2))
+    return
+  with open(path, "w") as stats_file:
+    json.dump(stats_summary, stats_file, indent=2)
 
-  for acl in acls:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(acl)
-    else:
-      logger.info(acl)
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+def print_stats():
+  """
+  Prints and/or writes the API call summary, with --stats / --stats-json.
+  """
 
-  return
+  if stats.recorder is None:
+    return
 
+  stats_summary = stats.summary()
+  if args.stats:
+    stats_section(stats_summary).emit()
+  if args.stats_json:
+    write_stats_json(stats_summary, args.stats_json)
 
-def describe_sgs():
-  sgs = vpc_client.describe_security_groups(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['SecurityGroups']
 
-   # sgs = [sg['GroupId'] for sg in sgs]
+def run_watch(regions):
+  """
+  Prints a full report of every region, then only the changes as the collectors are re-polled, until interrupted.
+  """
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"Security Groups in VPC {vpc_id}:")
-  else:
-    logger.info(f"Security Groups in VPC {vpc_id}:")
+  watchers = [vpc_inventory.watcher(vpc_ids(), kinds, skip_kinds, args.watch) for vpc_inventory in region_inventories(regions)]
 
-  for sg in sgs:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(sg['GroupId'])
+  for watcher, region_task in watch.first_polls(watchers):
+    if clients.aws_error(region_task.error) is not None:
+      renderer.error(f"scan_region({region_task.name})", region_task.error, region=region_task.name)
+    elif region_task.error is not None:
+      raise region_task.error
     else:
-      logger.info(sg['GroupId'])
-
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+      renderer.region(region_task.result, tag_region=len(regions) > 1)
 
-  return
+  try:
+    for region, changes, errors in watch.watch(watchers):
+      for error in errors:
+        if clients.aws_error(error.error) is None:
+          raise error.error
+        renderer.error(error.name, error.error, region=region)
+      if changes:
+        renderer.changes(region, changes, tag_region=len(regions) > 1)
+  except KeyboardInterrupt:
+    pass
+
+
+def run_scan(regions, start):
+  """
+  Scans every region (of every account in fleet mode) and prints the report.
+  """
 
+  # (account, TaskResult) per region, fleet results stream in as each work item finishes
+  if role_arns:
+    region_tasks = fleet_region_tasks(regions)
+  else:
+    # Records, and the console report with --progressive, are rendered as each collector finishes
+    listener = None
+    if args.progressive:
+      renderer.start(regions)
+      listener = renderer
+    elif args.output != "console":
+      listener = renderer
+    region_tasks = ((None, region_task)
+                    for region_task in inventory.collect_all(region_inventories(regions), vpc_ids(), kinds, skip_kinds,
+                                                             args.discovery, listener))
+
+  found_vpc_ids = set()
+  for account, region_task in region_tasks:
+    name = f"scan_region({account} {region_task.name})" if account else f"scan_region({region_task.name})"
+    if clients.aws_error(region_task.error) is not None:
+      renderer.error(name, region_task.error, account, region_task.name)
+    elif region_task.error is not None:
+      raise region_task.error
+    else:
+      renderer.region(region_task.result, account, tag_region=len(regions) > 1)
+      found_vpc_ids.update(region_task.result.vpc_ids)
 
-def describe_rtbs():
-  rtbs = vpc_client.describe_route_tables(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['RouteTables']
-  
-  # Get a list of Routing tables
-  rtbs = [rtb['RouteTableId'] for rtb in rtbs]
-  
-  if args.colorize == "yes":
-     cp.print_fg_bright_blue(f"Routing tables in VPC {vpc_id}:")
-  else:
-    logger.info(f"Routing tables in VPC {vpc_id}:")
+  for vpc in requested_vpc_ids:
+    if vpc not in found_vpc_ids:
+      renderer.not_found(vpc, regions)
 
-  for rtb in rtbs:
+  if len(regions) > 1 or role_arns:
     if args.colorize == "yes":
-      cp.print_fg_bright_green(rtb)
+      cp.print_fg_bright_blue(f"Total wall time: {time.perf_counter() - start:.2f}s ({len(regions)} regions, {max(1, len(role_arns))} accounts)")
     else:
-      logger.info(rtb)
+      logger.info(f"Total wall time: {time.perf_counter() - start:.2f}s ({len(regions)} regions, {max(1, len(role_arns))} accounts)")
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+#-----------------------------------------------------------[Execution]------------------------------------------------------------
+
+# ************************************
+# Main Script Execution
+# ************************************
 
-  return
+def main(argv=None):
+  """
+  Parses the command line, then scans and prints the requested VPCs.
+  """
 
+  global args, session, inventory_cache, requested_vpc_ids, role_arns, kinds, skip_kinds, renderer, printer
 
-def describe_vpc_epts():
-  epts = vpc_client.describe_vpc_endpoints(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])['VpcEndpoints']
+  logging.basicConfig(level=logging.INFO, format='%(message)s')
+  args = build_parser().parse_args(argv)
+  if args.stats_json == "-" and args.output != "console":
+    build_parser().error(f"--stats-json - would write to stdout, which carries the --output {args.output} records: give a file")
+  renderer = init_renderer()
+  printer = cp.SectionPrinter(args.colorize == "yes", logger)
 
-  # Get a list of VPC Endpoints
-  epts = [ept['VpcEndpointId'] for ept in epts]
-  
   if args.colorize == "yes":
-    cp.print_fg_bright_blue(f"VPC EndPoints in VPC {vpc_id}:")
+    cp.print_fg_bright_green(f"Arguments Passed: {args}")
   else:
-    logger.info(f"VPC EndPoints in VPC {vpc_id}:")
+    logger.info(f"Arguments Passed: {args}")
 
-  for ept in epts:
-    if args.colorize == "yes":
-      cp.print_fg_bright_green(ept)
-    else:
-      logger.info(ept)
+  try:
+    init_client_config()
+  except (OSError, ValueError) as e:
+    build_parser().error(str(e))
+  if args.stats or args.stats_json:
+    stats.enable()
+  if not args.no_rate_limit:
+    ratelimit.enable(ratelimit.parse_rates(args.rate_limit))
+  session = init_session()
+  inventory_cache = init_cache()
+  requested_vpc_ids = [vpc for value in (args.vpc or []) for vpc in value.split(',') if vpc]
+  role_arns = fleet.read_role_arns(args.role_arns, args.role_arns_file)
+
+  kinds = [key for key in (args.only or '').split(',') if key]
+  skip_kinds = [key for key in (args.skip or '').split(',') if key]
+  try:
+    collectors.select_specs(kinds, skip_kinds)
+  except ValueError as e:
+    build_parser().error(str(e))
+
+  if args.progressive and (args.serve or role_arns or args.watch or args.output != "console"):
+    build_parser().error("--progressive only applies to the console report of a scan (not --serve, fleet mode or --watch), "
+                         "--output records are always written as each collector finishes")
+
+  if args.serve:
+    if role_arns or args.regions or args.watch:
+      build_parser().error("--serve does not support fleet mode, --regions or --watch (use ?region= in the requests)")
+    # Imported here, only serve mode needs the HTTP server
+    from modules import server
+    try:
+      address = server.parse_address(args.serve)
+    except ArgumentTypeError as e:
+      build_parser().error(f"argument --serve: {e}")
+    ttl = server.DEFAULT_TTL if args.serve_ttl is None else args.serve_ttl
+    server.serve(address,
+                 server.InventoryService(args.region, args.workers, ttl, kinds=kinds or None, skip=skip_kinds,
+                                         session=session))
+    print_stats()
+    return
 
-  if args.colorize == "yes":
-    cp.print_fg_bright_yellow("--------------------------------------------")
-  else:
-    logger.info("--------------------------------------------")
+  start = time.perf_counter()
+  regions = get_regions()
 
-  return
+  if args.watch:
+    if role_arns:
+      build_parser().error("--watch does not support fleet mode (--role-arns, --role-arns-file)")
+    try:
+      run_watch(regions)
+    finally:
+      renderer.close()
+    print_stats()
+    return
 
-#-----------------------------------------------------------[Execution]------------------------------------------------------------
+  try:
+    run_scan(regions, start)
+  finally:
+    renderer.close()
+  print_stats()
 
-# ************************************
-# Main Script Execution
-# ************************************
 
 # Note: Below is strickly for running from a command line call:
 # Will only run if this file is called as primary file 
 if __name__ == '__main__':
-    
-  if vpc_in_region():
-    describe_ekss()
-    describe_asgs()
-    describe_rdss()
-    describe_ec2s()
-    describe_lambdas()
-    describe_elbs()
-    describe_elbsV2()
-    describe_nats()
-    describe_vpc_epts()
-    describe_igws()
-    describe_vpgws()
-    describe_enis()
-    describe_sgs()
-    describe_rtbs()
-    describe_acls()
-    describe_subnets()
-  else:
-    if args.colorize == "yes":
-      cp.print_blink(f"The given VPC was not found in {args.region}")
-    else:
-      logger.info(f"The given VPC was not found in {args.region}")
-
+  main()